@@ -0,0 +1,20 @@
+import pytest
+from django.test import override_settings
+
+
+@pytest.fixture(scope='session', autouse=True)
+def isolated_stores():
+    """Кэш и метрики тестов — во временном каталоге, а не в файлах,
+    которые читает работающий сайт."""
+    from core.runner import isolated_stores
+
+    with isolated_stores():
+        yield
+
+
+@pytest.fixture(scope='session', autouse=True)
+def no_background_images():
+    """Фоновые потоки не пишут копии картинок во временный MEDIA_ROOT,
+    который тест уже удаляет."""
+    with override_settings(IMAGE_PREGENERATE=False):
+        yield
@@ -0,0 +1,36 @@
+POST_FIELDS = {
+    'id': lambda post: post.pk,
+    'text': lambda post: post.text,
+    'pub_date': lambda post: post.pub_date.isoformat(),
+    'author': lambda post: post.author.username,
+    'group': lambda post: post.group.slug if post.group_id else None,
+    'image': lambda post: post.image.url if post.image else None,
+    'image_width': lambda post: post.image_width,
+    'image_height': lambda post: post.image_height,
+}
+
+COMMENT_FIELDS = {
+    'id': lambda comment: comment.pk,
+    'post': lambda comment: comment.post_id,
+    'author': lambda comment: comment.author.username,
+    'text': lambda comment: comment.text,
+    'created': lambda comment: comment.created.isoformat(),
+}
+
+GROUP_FIELDS = {
+    'slug': lambda group: group.slug,
+    'title': lambda group: group.title,
+    'description': lambda group: group.description,
+}
+
+PROFILE_FIELDS = {
+    'username': lambda author: author.username,
+    'full_name': lambda author: author.get_full_name(),
+    'posts_count': lambda author: author.stats.posts_count,
+    'followers_count': lambda author: author.stats.followers_count,
+    'following_count': lambda author: author.stats.following_count,
+}
+
+
+def serialize(obj, fields):
+    return {name: getter(obj) for name, getter in fields.items()}
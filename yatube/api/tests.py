@@ -0,0 +1,100 @@
+from http import HTTPStatus
+
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Group, Post, User
+
+
+class ApiTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(
+            username='author', first_name='Лев', last_name='Толстой'
+        )
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Группа',
+            slug='test-slug',
+            description='Описание',
+        )
+        Post.objects.bulk_create(
+            Post(author=cls.author, text=f'Пост {i}') for i in range(12)
+        )
+        cls.post = Post.objects.create(
+            author=cls.author, group=cls.group, text='Пост в группе'
+        )
+        Comment.objects.create(post=cls.post, author=cls.reader, text='Ок')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def test_posts_cursor_pagination(self):
+        """Список постов листается курсором без повторов."""
+        first = self.client.get(reverse('api:post_list')).json()
+        self.assertEqual(len(first['results']), 10)
+        self.assertIsNone(first['previous'])
+        second = self.client.get(
+            reverse('api:post_list'), {'cursor': first['next']}
+        ).json()
+        self.assertEqual(len(second['results']), 3)
+        self.assertIsNone(second['next'])
+        ids = [post['id'] for post in first['results'] + second['results']]
+        self.assertEqual(len(set(ids)), Post.objects.count())
+
+    def test_field_selection(self):
+        """Параметр fields ограничивает набор полей."""
+        response = self.client.get(
+            reverse('api:post_detail', kwargs={'post_id': self.post.pk}),
+            {'fields': 'id,group'}
+        )
+        self.assertEqual(
+            response.json(), {'id': self.post.pk, 'group': 'test-slug'}
+        )
+        response = self.client.get(
+            reverse('api:post_detail', kwargs={'post_id': self.post.pk}),
+            {'fields': 'image,image_width,image_height'}
+        )
+        self.assertEqual(response.json(), {
+            'image': None, 'image_width': None, 'image_height': None
+        })
+        response = self.client.get(
+            reverse('api:post_list'), {'fields': 'password'}
+        )
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+
+    def test_filters_and_related_objects(self):
+        """Посты группы, комментарии, группа и профиль."""
+        posts = self.client.get(
+            reverse('api:post_list'), {'group': 'test-slug'}
+        ).json()['results']
+        self.assertEqual([post['id'] for post in posts], [self.post.pk])
+        comments = self.client.get(reverse(
+            'api:comment_list', kwargs={'post_id': self.post.pk}
+        )).json()['results']
+        self.assertEqual(comments[0]['author'], 'reader')
+        group = self.client.get(reverse(
+            'api:group_detail', kwargs={'slug': 'test-slug'}
+        )).json()
+        self.assertEqual(group['title'], 'Группа')
+        profile = self.client.get(reverse(
+            'api:profile_detail', kwargs={'username': 'author'}
+        )).json()
+        self.assertEqual(profile['full_name'], 'Лев Толстой')
+        self.assertEqual(profile['followers_count'], 1)
+
+    def test_missing_objects_return_json_404(self):
+        """Несуществующий объект — 404 в JSON."""
+        response = self.client.get(
+            reverse('api:post_detail', kwargs={'post_id': 0})
+        )
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+        self.assertIn('detail', response.json())
+
+    def test_follow_feed_requires_auth(self):
+        """Лента подписок доступна только авторизованному."""
+        response = self.client.get(reverse('api:follow_list'))
+        self.assertEqual(response.status_code, HTTPStatus.UNAUTHORIZED)
+        client = Client()
+        client.force_login(self.reader)
+        response = client.get(reverse('api:follow_list'))
+        self.assertEqual(len(response.json()['results']), 10)
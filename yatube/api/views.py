@@ -0,0 +1,133 @@
+from functools import wraps
+from http import HTTPStatus
+
+from django.http import Http404, JsonResponse
+from django.shortcuts import get_object_or_404
+from django.views.decorators.http import require_GET
+
+from posts import sharding
+from posts.feed import follow_feed
+from posts.models import Group, Post, User
+from posts.stats import author_stats
+from posts.utils import POSTS_PER_PAGE, CursorPaginator
+
+from .serializers import (COMMENT_FIELDS, GROUP_FIELDS, POST_FIELDS,
+                          PROFILE_FIELDS, serialize)
+
+MAX_LIMIT = 100
+
+
+class ApiError(Exception):
+    def __init__(self, detail, status=HTTPStatus.BAD_REQUEST):
+        super().__init__(detail)
+        self.detail = detail
+        self.status = status
+
+
+def respond(data, status=HTTPStatus.OK):
+    return JsonResponse(
+        data,
+        status=status,
+        json_dumps_params={'ensure_ascii': False, 'separators': (',', ':')},
+    )
+
+
+def api_view(view):
+    @require_GET
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        try:
+            return view(request, *args, **kwargs)
+        except Http404:
+            return respond({'detail': 'Не найдено'}, HTTPStatus.NOT_FOUND)
+        except ApiError as error:
+            return respond({'detail': error.detail}, error.status)
+    return wrapper
+
+
+def selected_fields(request, fields):
+    """Поля из ?fields=a,b; без параметра — все поля."""
+    names = request.GET.get('fields')
+    if not names:
+        return fields
+    selected = {}
+    for name in names.split(','):
+        if name not in fields:
+            raise ApiError(f'Неизвестное поле: {name}')
+        selected[name] = fields[name]
+    return selected
+
+
+def page_limit(request):
+    try:
+        limit = int(request.GET.get('limit', POSTS_PER_PAGE))
+    except ValueError:
+        raise ApiError('limit должен быть числом')
+    if not 0 < limit <= MAX_LIMIT:
+        raise ApiError(f'limit должен быть от 1 до {MAX_LIMIT}')
+    return limit
+
+
+def paginated(request, queryset, fields, field='pub_date'):
+    fields = selected_fields(request, fields)
+    paginator = CursorPaginator(queryset, page_limit(request), field)
+    page = paginator.get_page(request.GET.get('cursor'))
+    return respond({
+        'results': [serialize(obj, fields) for obj in page],
+        'next': page.next_cursor,
+        'previous': page.previous_cursor,
+    })
+
+
+@api_view
+def post_list(request):
+    posts = Post.objects.for_feed()
+    if 'group' in request.GET:
+        posts = posts.filter(group__slug=request.GET['group'])
+    if 'author' in request.GET:
+        posts = posts.filter(author__username=request.GET['author'])
+    return paginated(request, sharding.scatter(posts), POST_FIELDS)
+
+
+@api_view
+def post_detail(request, post_id):
+    fields = selected_fields(request, POST_FIELDS)
+    post = sharding.get_post_or_404(Post.objects.for_feed(), post_id)
+    return respond(serialize(post, fields))
+
+
+@api_view
+def comment_list(request, post_id):
+    post = sharding.get_post_or_404(Post.objects.all(), post_id)
+    comments = post.comments.select_related('author')
+    return paginated(request, comments, COMMENT_FIELDS, field='created')
+
+
+@api_view
+def group_list(request):
+    fields = selected_fields(request, GROUP_FIELDS)
+    groups = Group.objects.order_by('title')
+    return respond({'results': [serialize(group, fields) for group in groups]})
+
+
+@api_view
+def group_detail(request, slug):
+    fields = selected_fields(request, GROUP_FIELDS)
+    group = get_object_or_404(Group, slug=slug)
+    return respond(serialize(group, fields))
+
+
+@api_view
+def profile_detail(request, username):
+    fields = selected_fields(request, PROFILE_FIELDS)
+    author = get_object_or_404(User, username=username)
+    author.stats = author_stats(author)
+    return respond(serialize(author, fields))
+
+
+@api_view
+def follow_list(request):
+    if not request.user.is_authenticated:
+        raise ApiError('Нужна авторизация', HTTPStatus.UNAUTHORIZED)
+    posts = follow_feed(request.user).for_feed()
+    return paginated(request, posts, POST_FIELDS)
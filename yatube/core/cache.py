@@ -0,0 +1,305 @@
+"""Общий для всех процессов узла кэш в файле SQLite.
+
+Записи вытесняются по давности последнего чтения (LRU), когда кэш
+выходит за MAX_ENTRIES записей или MAX_SIZE байт. Для ключей с префиксами
+из SINGLE_FLIGHT_PREFIXES (по умолчанию фрагменты шаблонов) после промаха
+пересчитывает значение только один процесс: остальные ждут, пока он
+запишет результат, но не дольше LOCK_TIMEOUT секунд.
+"""
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+from . import metrics
+
+SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS cache ('
+    'key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL, '
+    'accessed REAL NOT NULL, size INTEGER NOT NULL)',
+    'CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed)',
+    'CREATE INDEX IF NOT EXISTS cache_expires ON cache (expires)',
+    'CREATE TABLE IF NOT EXISTS locks ('
+    'key TEXT PRIMARY KEY, expires REAL NOT NULL)',
+)
+# Время последнего чтения обновляется не чаще раза в TOUCH_INTERVAL секунд,
+# чтобы чтения не превращались в запись.
+TOUCH_INTERVAL = 30
+LOCK_POLL_INTERVAL = 0.05
+
+
+class SQLiteCache(BaseCache):
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self.path = location
+        self.max_size = options.get('MAX_SIZE', 64 * 1024 * 1024)
+        self.cull_every = options.get('CULL_EVERY', 100)
+        self.lock_timeout = options.get('LOCK_TIMEOUT', 5)
+        self.single_flight_prefixes = tuple(
+            options.get('SINGLE_FLIGHT_PREFIXES', ('template.cache.',))
+        )
+        self._local = threading.local()
+        self._sets = 0
+
+    @property
+    def connection(self):
+        local = self._local
+        if getattr(local, 'pid', None) != os.getpid():
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(
+                self.path, timeout=30, isolation_level=None
+            )
+            connection.execute('PRAGMA journal_mode = WAL')
+            connection.execute('PRAGMA synchronous = NORMAL')
+            for statement in SCHEMA:
+                connection.execute(statement)
+            local.connection = connection
+            local.pid = os.getpid()
+        return local.connection
+
+    def _single_flight(self, raw_key):
+        return raw_key.startswith(self.single_flight_prefixes)
+
+    def _read(self, key):
+        now = time.time()
+        row = self.connection.execute(
+            'SELECT value, expires, accessed FROM cache WHERE key = ?',
+            (key,),
+        ).fetchone()
+        if row is None:
+            return None
+        value, expires, accessed = row
+        if expires is not None and expires <= now:
+            self.connection.execute(
+                'DELETE FROM cache WHERE key = ? AND expires <= ?',
+                (key, now),
+            )
+            return None
+        if accessed < now - TOUCH_INTERVAL:
+            self.connection.execute(
+                'UPDATE cache SET accessed = ? WHERE key = ?', (now, key)
+            )
+        return value
+
+    def _write(self, key, value, timeout, only_new=False):
+        data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        now = time.time()
+        connection = self.connection
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            if only_new:
+                row = connection.execute(
+                    'SELECT expires FROM cache WHERE key = ?', (key,)
+                ).fetchone()
+                if row and (row[0] is None or row[0] > now):
+                    connection.execute('COMMIT')
+                    return False
+            connection.execute(
+                'INSERT OR REPLACE INTO cache '
+                '(key, value, expires, accessed, size) '
+                'VALUES (?, ?, ?, ?, ?)',
+                (key, data, self.get_backend_timeout(timeout), now, len(data)),
+            )
+            connection.execute('DELETE FROM locks WHERE key = ?', (key,))
+            connection.execute('COMMIT')
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        self._sets += 1
+        if self._sets % self.cull_every == 0:
+            self.cull()
+        return True
+
+    def _acquire(self, key):
+        now = time.time()
+        connection = self.connection
+        connection.execute(
+            'DELETE FROM locks WHERE key = ? AND expires <= ?', (key, now)
+        )
+        cursor = connection.execute(
+            'INSERT OR IGNORE INTO locks (key, expires) VALUES (?, ?)',
+            (key, now + self.lock_timeout),
+        )
+        return cursor.rowcount == 1
+
+    def _wait(self, key):
+        deadline = time.monotonic() + self.lock_timeout
+        while time.monotonic() < deadline:
+            time.sleep(LOCK_POLL_INTERVAL)
+            value = self._read(key)
+            if value is not None:
+                return value
+            if not self.connection.execute(
+                'SELECT 1 FROM locks WHERE key = ?', (key,)
+            ).fetchone():
+                return None
+        return None
+
+    def get(self, key, default=None, version=None):
+        raw_key = key
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        value = self._read(key)
+        metrics.cache_lookup(raw_key, value is not None)
+        if value is None and self._single_flight(raw_key):
+            if not self._acquire(key):
+                value = self._wait(key)
+        if value is None:
+            return default
+        return pickle.loads(value)
+
+    def get_or_set(self, key, default, timeout=DEFAULT_TIMEOUT,
+                   version=None):
+        cache_key = self.make_key(key, version=version)
+        self.validate_key(cache_key)
+        value = self._read(cache_key)
+        if value is None and not self._acquire(cache_key):
+            value = self._wait(cache_key)
+        if value is not None:
+            return pickle.loads(value)
+        if callable(default):
+            default = default()
+        if default is None:
+            self.connection.execute(
+                'DELETE FROM locks WHERE key = ?', (cache_key,)
+            )
+            return None
+        self._write(cache_key, default, timeout)
+        return default
+
+    def get_many(self, keys, version=None):
+        found = {}
+        for key in keys:
+            cache_key = self.make_key(key, version=version)
+            self.validate_key(cache_key)
+            value = self._read(cache_key)
+            metrics.cache_lookup(key, value is not None)
+            if value is not None:
+                found[key] = pickle.loads(value)
+        return found
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        self._write(key, value, timeout)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        now = time.time()
+        expires = self.get_backend_timeout(timeout)
+        rows = []
+        for key, value in data.items():
+            key = self.make_key(key, version=version)
+            self.validate_key(key)
+            value = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+            rows.append((key, value, expires, now, len(value)))
+        connection = self.connection
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            connection.executemany(
+                'INSERT OR REPLACE INTO cache '
+                '(key, value, expires, accessed, size) '
+                'VALUES (?, ?, ?, ?, ?)',
+                rows,
+            )
+            connection.executemany(
+                'DELETE FROM locks WHERE key = ?', [row[:1] for row in rows]
+            )
+            connection.execute('COMMIT')
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        before = self._sets
+        self._sets += len(rows)
+        if before // self.cull_every != self._sets // self.cull_every:
+            self.cull()
+        return []
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return self._write(key, value, timeout, only_new=True)
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        cursor = self.connection.execute(
+            'UPDATE cache SET expires = ? WHERE key = ?',
+            (self.get_backend_timeout(timeout), key),
+        )
+        return cursor.rowcount == 1
+
+    def delete(self, key, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        self.connection.execute('DELETE FROM cache WHERE key = ?', (key,))
+
+    def delete_many(self, keys, version=None):
+        keys = [self.make_key(key, version=version) for key in keys]
+        for key in keys:
+            self.validate_key(key)
+        self.connection.executemany(
+            'DELETE FROM cache WHERE key = ?', [(key,) for key in keys]
+        )
+
+    def has_key(self, key, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return self._read(key) is not None
+
+    def incr(self, key, delta=1, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        connection = self.connection
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            row = connection.execute(
+                'SELECT value, expires FROM cache WHERE key = ?', (key,)
+            ).fetchone()
+            if row is None or (row[1] is not None and row[1] <= time.time()):
+                raise ValueError("Key '%s' not found" % key)
+            value = pickle.loads(row[0]) + delta
+            data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+            connection.execute(
+                'UPDATE cache SET value = ?, size = ? WHERE key = ?',
+                (data, len(data), key),
+            )
+            connection.execute('COMMIT')
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        return value
+
+    def clear(self):
+        self.connection.execute('DELETE FROM cache')
+        self.connection.execute('DELETE FROM locks')
+
+    def cull(self):
+        """Удаляет просроченные записи, затем самые давно читавшиеся,
+        пока кэш не уложится в лимиты."""
+        connection = self.connection
+        now = time.time()
+        connection.execute('DELETE FROM cache WHERE expires <= ?', (now,))
+        connection.execute('DELETE FROM locks WHERE expires <= ?', (now,))
+        count, size = connection.execute(
+            'SELECT COUNT(*), COALESCE(SUM(size), 0) FROM cache'
+        ).fetchone()
+        if count <= self._max_entries and size <= self.max_size:
+            return
+        excess = max(count - self._max_entries, 0)
+        if size > self.max_size:
+            excess = max(excess, count * (size - self.max_size) // size + 1)
+        connection.execute(
+            'DELETE FROM cache WHERE key IN ('
+            'SELECT key FROM cache ORDER BY accessed LIMIT ?)',
+            (excess,),
+        )
+
+    def close(self, **kwargs):
+        # Соединение живёт до конца потока: файл открывается один раз.
+        pass
@@ -0,0 +1,21 @@
+"""Настройки соединений SQLite через PRAGMA.
+
+Общие значения берутся из SQLITE_PRAGMAS, для отдельной базы их можно
+дополнить или переопределить ключом PRAGMAS в DATABASES.
+"""
+from django.conf import settings
+
+
+def sqlite_pragmas(settings_dict):
+    return {
+        **getattr(settings, 'SQLITE_PRAGMAS', {}),
+        **settings_dict.get('PRAGMAS', {}),
+    }
+
+
+def apply_pragmas(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for name, value in sqlite_pragmas(connection.settings_dict).items():
+            cursor.execute(f'PRAGMA {name} = {value}')
@@ -0,0 +1,132 @@
+import json
+import multiprocessing
+import os
+import random
+import sqlite3
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.db import sqlite_pragmas
+from core.management.commands.benchmark_views import percentile
+
+# Как было до настройки: журнал DELETE, synchronous FULL и новое
+# соединение на каждый запрос (CONN_MAX_AGE = 0).
+BASELINE = {
+    'pragmas': {'journal_mode': 'DELETE', 'synchronous': 'FULL'},
+    'persistent': False,
+}
+SCHEMA = (
+    'CREATE TABLE post (id INTEGER PRIMARY KEY, text TEXT NOT NULL, '
+    'pub_date REAL NOT NULL)',
+    'CREATE INDEX post_pub_date ON post (pub_date)',
+)
+READ = 'SELECT id, text FROM post ORDER BY pub_date DESC LIMIT 10 OFFSET ?'
+WRITE = 'INSERT INTO post (text, pub_date) VALUES (?, ?)'
+
+
+def connect(path, pragmas):
+    connection = sqlite3.connect(path, timeout=5)
+    for name, value in pragmas.items():
+        connection.execute(f'PRAGMA {name} = {value}')
+    return connection
+
+
+def worker(path, pragmas, persistent, role, duration, seed):
+    rng = random.Random(seed)
+    connection = connect(path, pragmas) if persistent else None
+    latencies, errors = [], 0
+    deadline = time.monotonic() + duration
+    while time.monotonic() < deadline:
+        started = time.perf_counter()
+        current = connection or connect(path, pragmas)
+        try:
+            if role == 'read':
+                current.execute(READ, (rng.randrange(1000),)).fetchall()
+            else:
+                with current:
+                    current.execute(WRITE, ('x' * 200, time.time()))
+        except sqlite3.OperationalError:
+            errors += 1
+        finally:
+            if connection is None:
+                current.close()
+        latencies.append((time.perf_counter() - started) * 1000)
+    return role, latencies, errors
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает чтение и запись в SQLite при параллельной нагрузке '
+            'до и после настройки PRAGMA и постоянных соединений.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--readers', type=int, default=4)
+        parser.add_argument('--writers', type=int, default=2)
+        parser.add_argument('--duration', type=float, default=5)
+        parser.add_argument('--rows', type=int, default=100000)
+        parser.add_argument('--output', '-o', help='Файл для JSON-отчёта.')
+
+    def handle(self, *args, **options):
+        tuned = {
+            'pragmas': sqlite_pragmas(settings.DATABASES['default']),
+            'persistent': settings.DATABASES['default'].get(
+                'CONN_MAX_AGE', 0
+            ) != 0,
+        }
+        report = {}
+        for name, config in (('baseline', BASELINE), ('tuned', tuned)):
+            report[name] = self.run(config, options)
+            self.print_result(name, report[name])
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as stream:
+                json.dump(report, stream, ensure_ascii=False, indent=2)
+
+    def run(self, config, options):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'bench.sqlite3')
+            connection = connect(path, config['pragmas'])
+            for statement in SCHEMA:
+                connection.execute(statement)
+            with connection:
+                connection.executemany(WRITE, (
+                    ('x' * 200, i) for i in range(options['rows'])
+                ))
+            connection.close()
+            roles = (['read'] * options['readers']
+                     + ['write'] * options['writers'])
+            with multiprocessing.Pool(len(roles)) as pool:
+                results = pool.starmap(worker, [
+                    (path, config['pragmas'], config['persistent'], role,
+                     options['duration'], seed)
+                    for seed, role in enumerate(roles)
+                ])
+        summary = {'config': config}
+        for role in ('read', 'write'):
+            latencies = [value for kind, values, _ in results
+                         if kind == role for value in values]
+            summary[role] = {
+                'per_second': round(len(latencies) / options['duration']),
+                'p50_ms': round(percentile(latencies, 50), 3)
+                if latencies else None,
+                'p95_ms': round(percentile(latencies, 95), 3)
+                if latencies else None,
+                'p99_ms': round(percentile(latencies, 99), 3)
+                if latencies else None,
+                'max_ms': round(max(latencies), 3) if latencies else None,
+                'errors': sum(errors for kind, _, errors in results
+                              if kind == role),
+            }
+        return summary
+
+    def print_result(self, name, result):
+        self.stdout.write(f'{name}: {result["config"]}')
+        for role in ('read', 'write'):
+            stats = result[role]
+            self.stdout.write(
+                f'  {role:5} {stats["per_second"]:8} в секунду  '
+                f'p50 {stats["p50_ms"]} мс  p95 {stats["p95_ms"]} мс  '
+                f'p99 {stats["p99_ms"]} мс  max {stats["max_ms"]} мс  '
+                f'ошибок {stats["errors"]}'
+            )
@@ -0,0 +1,180 @@
+import json
+import statistics
+import subprocess
+import time
+import tracemalloc
+from importlib import import_module
+
+from django.contrib.auth.tokens import default_token_generator
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.encoding import force_bytes
+from django.utils.http import urlsafe_base64_encode
+
+from posts.models import Comment, Follow, Group, Post, User
+
+URLCONFS = ('posts.urls', 'users.urls', 'about.urls')
+
+
+def percentile(values, percent):
+    values = sorted(values)
+    index = max(0, -(-len(values) * percent // 100) - 1)
+    return values[int(index)]
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = ('Замеряет время ответа, число запросов и память для каждого '
+            'адреса posts, users и about.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--output', '-o', help='Файл для JSON-отчёта.')
+        parser.add_argument(
+            '--username',
+            help='Пользователь для страниц, требующих входа; по умолчанию '
+                 'тот, у кого больше всего подписок.'
+        )
+        parser.add_argument(
+            '--anonymous', action='store_true',
+            help='Запрашивать страницы без входа.'
+        )
+        parser.add_argument(
+            '--cold', action='store_true',
+            help='Очищать кэш перед каждым запросом.'
+        )
+
+    def handle(self, *args, **options):
+        self.repeat = max(options['repeat'], 1)
+        self.cold = options['cold']
+        self.user = None if options['anonymous'] else self.pick_user(
+            options['username']
+        )
+        samples = self.samples()
+        results = []
+        for namespace, name, kwargs in self.url_patterns(samples):
+            view = f'{namespace}:{name}'
+            if kwargs is None:
+                self.stderr.write(f'{view}: нет данных для аргументов')
+                continue
+            url = reverse(view, kwargs=kwargs)
+            try:
+                result = self.measure(url)
+            except Exception as error:
+                # Клиент Django 2.2 пробрасывает исключения представлений.
+                results.append(
+                    {'view': view, 'url': url, 'error': repr(error)}
+                )
+                self.stderr.write(f'{view}: {error!r}')
+                continue
+            result['view'] = view
+            results.append(result)
+            self.stdout.write(
+                f"{view:40} {result['status']} "
+                f"p50 {result['p50_ms']:8.2f} мс  "
+                f"p95 {result['p95_ms']:8.2f} мс  "
+                f"запросов {result['queries']:3}  "
+                f"память {result['peak_memory_kb']:8.1f} КБ"
+            )
+        report = {
+            'revision': git_revision(),
+            'created': timezone.now().isoformat(),
+            'repeat': self.repeat,
+            'cold': self.cold,
+            'user': self.user and self.user.username,
+            'dataset': {
+                'users': User.objects.count(),
+                'groups': Group.objects.count(),
+                'posts': Post.objects.count(),
+                'comments': Comment.objects.count(),
+                'follows': Follow.objects.count(),
+            },
+            'views': results,
+        }
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as stream:
+                json.dump(report, stream, ensure_ascii=False, indent=2)
+            self.stdout.write(f"Отчёт сохранён в {options['output']}")
+
+    def pick_user(self, username):
+        if username:
+            try:
+                return User.objects.get(username=username)
+            except User.DoesNotExist:
+                raise CommandError(f'Нет пользователя {username}')
+        return User.objects.order_by('-stats__following_count').first()
+
+    def samples(self):
+        post = Post.objects.order_by('-pk').select_related('author').first()
+        group = Group.objects.order_by('pk').first()
+        samples = {
+            'post_id': post and post.pk,
+            'username': post and post.author.username,
+            'slug': group and group.slug,
+        }
+        if self.user:
+            samples['uidb64'] = urlsafe_base64_encode(force_bytes(
+                self.user.pk
+            ))
+            samples['token'] = default_token_generator.make_token(self.user)
+        return samples
+
+    def url_patterns(self, samples):
+        for module_name in URLCONFS:
+            module = import_module(module_name)
+            for pattern in module.urlpatterns:
+                names = pattern.pattern.regex.groupindex
+                kwargs = {name: samples.get(name) for name in names}
+                if None in kwargs.values():
+                    kwargs = None
+                yield module.app_name, pattern.name, kwargs
+
+    def prepare(self, client):
+        if self.cold:
+            cache.clear()
+        if self.user:
+            # Страница выхода завершает сессию, поэтому вход перед каждым
+            # запросом.
+            client.force_login(self.user)
+
+    def measure(self, url):
+        client = Client()
+        self.prepare(client)
+        response = client.get(url)
+        timings, queries = [], []
+        for _ in range(self.repeat):
+            self.prepare(client)
+            with CaptureQueriesContext(connection) as captured:
+                started = time.perf_counter()
+                client.get(url)
+                timings.append((time.perf_counter() - started) * 1000)
+            queries.append(len(captured))
+        # Память меряется отдельным запросом: tracemalloc замедляет код.
+        self.prepare(client)
+        tracemalloc.start()
+        client.get(url)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        return {
+            'url': url,
+            'status': response.status_code,
+            'p50_ms': round(percentile(timings, 50), 3),
+            'p95_ms': round(percentile(timings, 95), 3),
+            'mean_ms': round(statistics.mean(timings), 3),
+            'queries': int(statistics.median(queries)),
+            'peak_memory_kb': round(peak / 1024, 1),
+        }
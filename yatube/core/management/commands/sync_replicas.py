@@ -0,0 +1,30 @@
+import sqlite3
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+
+
+def copy_database(source, target):
+    """Согласованная копия файла SQLite через backup API: писать
+    в основную базу во время копирования можно."""
+    source_connection = sqlite3.connect(source)
+    target_connection = sqlite3.connect(target)
+    try:
+        source_connection.backup(target_connection)
+    finally:
+        target_connection.close()
+        source_connection.close()
+
+
+class Command(BaseCommand):
+    help = 'Копирует основную базу SQLite в файлы реплик.'
+
+    def handle(self, *args, **options):
+        primary = settings.DATABASES[DEFAULT_DB_ALIAS]
+        if not primary['ENGINE'].endswith('sqlite3'):
+            raise CommandError('Копирование поддерживается только для SQLite')
+        for alias in settings.DATABASE_REPLICAS:
+            target = settings.DATABASES[alias]['NAME']
+            copy_database(primary['NAME'], target)
+            self.stdout.write(f'{alias}: {target}')
@@ -0,0 +1,212 @@
+"""Метрики в формате Prometheus, общие для всех процессов узла.
+
+Каждый процесс копит приращения в памяти и раз в METRICS_FLUSH_INTERVAL
+секунд добавляет их к суммам в файле SQLite (METRICS_STORE). Страница
+/metrics читает суммы из файла, поэтому видит все процессы сразу.
+"""
+import atexit
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+
+COUNTER = 'counter'
+HISTOGRAM = 'histogram'
+LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10,
+)
+METRICS = {
+    'yatube_http_request_duration_seconds': (
+        HISTOGRAM, 'Время ответа по имени адреса.'
+    ),
+    'yatube_db_queries_total': (
+        COUNTER, 'SQL-запросы по имени адреса.'
+    ),
+    'yatube_cache_requests_total': (
+        COUNTER, 'Обращения к кэшам фрагментов.'
+    ),
+    'yatube_image_derivatives_seconds': (
+        HISTOGRAM, 'Время нарезки копий картинки поста для srcset.'
+    ),
+    'yatube_image_resize_seconds': (
+        HISTOGRAM, 'Время создания копии картинки по геометрии.'
+    ),
+    'yatube_image_resize_total': (
+        COUNTER, 'Запросы копий картинок: найдена в кэше или создана.'
+    ),
+}
+SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS samples ('
+    'name TEXT NOT NULL, labels TEXT NOT NULL, value REAL NOT NULL, '
+    'PRIMARY KEY (name, labels))'
+)
+
+_pending = Counter()
+_lock = threading.Lock()
+_state = {'connection': None, 'pid': None, 'path': None, 'flushed': 0.0}
+
+
+def _connection():
+    path = settings.METRICS_STORE
+    if _state['pid'] != os.getpid() or _state['path'] != path:
+        connection = sqlite3.connect(
+            path, timeout=30, isolation_level=None,
+            check_same_thread=False,
+        )
+        connection.execute('PRAGMA journal_mode = WAL')
+        connection.execute('PRAGMA synchronous = NORMAL')
+        connection.execute(SCHEMA)
+        _state.update(connection=connection, pid=os.getpid(), path=path)
+    return _state['connection']
+
+
+def _key(name, labels):
+    return name, json.dumps(sorted(labels.items()), ensure_ascii=False)
+
+
+def _check(name):
+    if name not in METRICS:
+        raise ValueError(f'Метрика {name} не описана в METRICS.')
+
+
+def inc(name, value=1, **labels):
+    _check(name)
+    with _lock:
+        _pending[_key(name, labels)] += value
+    maybe_flush()
+
+
+def observe(name, value, buckets=LATENCY_BUCKETS, **labels):
+    _check(name)
+    with _lock:
+        for bound in buckets:
+            if value <= bound:
+                _pending[_key(f'{name}_bucket', {**labels, 'le': bound})] += 1
+        _pending[_key(f'{name}_bucket', {**labels, 'le': '+Inf'})] += 1
+        _pending[_key(f'{name}_sum', labels)] += value
+        _pending[_key(f'{name}_count', labels)] += 1
+    maybe_flush()
+
+
+def cache_lookup(raw_key, hit):
+    for cache_name, prefix in settings.METRICS_CACHE_PREFIXES.items():
+        if raw_key.startswith(prefix):
+            inc(
+                'yatube_cache_requests_total',
+                cache=cache_name, result='hit' if hit else 'miss',
+            )
+            return
+
+
+def maybe_flush():
+    if time.monotonic() - _state['flushed'] >= settings.METRICS_FLUSH_INTERVAL:
+        flush()
+
+
+def flush():
+    with _lock:
+        _state['flushed'] = time.monotonic()
+        if not _pending:
+            return
+        rows = [(name, labels, value)
+                for (name, labels), value in _pending.items()]
+        _pending.clear()
+        connection = _connection()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            connection.executemany(
+                'INSERT INTO samples (name, labels, value) VALUES (?, ?, ?) '
+                'ON CONFLICT (name, labels) '
+                'DO UPDATE SET value = value + excluded.value',
+                rows,
+            )
+            connection.execute('COMMIT')
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+
+
+atexit.register(flush)
+
+
+def _escape(value):
+    return (str(value).replace('\\', r'\\').replace('"', r'\"')
+            .replace('\n', r'\n'))
+
+
+def _format_labels(items):
+    if not items:
+        return ''
+    pairs = ','.join(f'{name}="{_escape(value)}"' for name, value in items)
+    return '{' + pairs + '}'
+
+
+def _format_value(value):
+    return str(int(value)) if value == int(value) else repr(value)
+
+
+def _sort_key(row):
+    name, items, _ = row
+    bound = dict(items).get('le')
+    labels = [item for item in items if item[0] != 'le']
+    order = float('inf') if bound in (None, '+Inf') else float(bound)
+    return name, labels, order
+
+
+def samples():
+    flush()
+    rows = [
+        (name, json.loads(labels), value)
+        for name, labels, value in _connection().execute(
+            'SELECT name, labels, value FROM samples'
+        )
+    ]
+    return sorted(rows, key=_sort_key)
+
+
+def hit_ratios(rows):
+    totals = {}
+    for name, items, value in rows:
+        if name != 'yatube_cache_requests_total':
+            continue
+        labels = dict(items)
+        hits, total = totals.get(labels['cache'], (0, 0))
+        if labels['result'] == 'hit':
+            hits += value
+        totals[labels['cache']] = (hits, total + value)
+    return {
+        cache_name: hits / total
+        for cache_name, (hits, total) in sorted(totals.items()) if total
+    }
+
+
+def render():
+    rows = samples()
+    lines = []
+    for family, (kind, help_text) in METRICS.items():
+        lines.append(f'# HELP {family} {help_text}')
+        lines.append(f'# TYPE {family} {kind}')
+        for name, items, value in rows:
+            if name == family or (
+                kind == HISTOGRAM and name.rsplit('_', 1)[0] == family
+            ):
+                lines.append(
+                    f'{name}{_format_labels(items)} {_format_value(value)}'
+                )
+    lines.append('# HELP yatube_cache_hit_ratio Доля попаданий в кэш.')
+    lines.append('# TYPE yatube_cache_hit_ratio gauge')
+    for cache_name, ratio in hit_ratios(rows).items():
+        lines.append(
+            f'yatube_cache_hit_ratio{{cache="{cache_name}"}} {ratio!r}'
+        )
+    return '\n'.join(lines) + '\n'
+
+
+def clear():
+    with _lock:
+        _pending.clear()
+        _connection().execute('DELETE FROM samples')
@@ -0,0 +1,145 @@
+import json
+import logging
+import time
+from collections import Counter
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+from . import metrics
+
+logger = logging.getLogger('core.sql')
+
+
+class QueryRecorder:
+    """Обёртка execute_wrapper: запоминает текст, параметры и время
+    каждого запроса, в том числе при DEBUG = False."""
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((
+                context['connection'].alias,
+                sql,
+                repr(params),
+                (time.perf_counter() - started) * 1000,
+            ))
+
+    def summary(self, slowest):
+        exact = Counter((sql, params) for _, sql, params, _ in self.queries)
+        similar = Counter(sql for _, sql, _, _ in self.queries)
+        return {
+            'queries': len(self.queries),
+            'db_ms': round(sum(query[3] for query in self.queries), 3),
+            'duplicates': sum(count - 1 for count in exact.values()),
+            'repeated': [
+                {'sql': sql, 'count': count}
+                for sql, count in similar.most_common()
+                if count > 1
+            ],
+            'slowest': [
+                {'alias': alias, 'sql': sql, 'ms': round(duration, 3)}
+                for alias, sql, _, duration in sorted(
+                    self.queries, key=lambda query: query[3], reverse=True
+                )[:slowest]
+            ],
+        }
+
+
+def budget_violations(summary, budget):
+    if isinstance(budget, int):
+        budget = {'queries': budget}
+    violations = {}
+    if summary['queries'] > budget.get('queries', float('inf')):
+        violations['queries'] = budget['queries']
+    if summary['db_ms'] > budget.get('db_ms', float('inf')):
+        violations['db_ms'] = budget['db_ms']
+    return violations
+
+
+class QueryInstrumentationMiddleware:
+    """Считает SQL-запросы каждого запроса, отдаёт итог в заголовке
+    Server-Timing и в журнале core.sql, сверяет с SQL_QUERY_BUDGETS."""
+
+    def __init__(self, get_response):
+        enabled = getattr(settings, 'SQL_INSTRUMENTATION', None)
+        if not (settings.DEBUG if enabled is None else enabled):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.budgets = getattr(settings, 'SQL_QUERY_BUDGETS', {})
+        self.slowest = getattr(settings, 'SQL_SLOWEST_QUERIES', 3)
+
+    def __call__(self, request):
+        recorder = QueryRecorder()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(recorder))
+            started = time.perf_counter()
+            response = self.get_response(request)
+            total_ms = (time.perf_counter() - started) * 1000
+        summary = recorder.summary(self.slowest)
+        match = request.resolver_match
+        view = match.view_name if match else None
+        response['Server-Timing'] = ', '.join((
+            f'db;dur={summary["db_ms"]:.3f};'
+            f'desc="{summary["queries"]} queries"',
+            f'dup;desc="{summary["duplicates"]} duplicates"',
+            f'total;dur={total_ms:.3f}',
+        ))
+        record = {
+            'method': request.method,
+            'path': request.path,
+            'view': view,
+            'status': response.status_code,
+            'total_ms': round(total_ms, 3),
+            **summary,
+        }
+        budget = self.budgets.get(view)
+        violations = (
+            budget_violations(summary, budget) if budget is not None else {}
+        )
+        if violations:
+            record['budget'] = violations
+            logger.warning(json.dumps(record, ensure_ascii=False))
+        else:
+            logger.info(json.dumps(record, ensure_ascii=False))
+        return response
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class MetricsMiddleware:
+    """Время ответа и число SQL-запросов по имени адреса для /metrics."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        counter = QueryCounter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(counter))
+            started = time.perf_counter()
+            response = self.get_response(request)
+            duration = time.perf_counter() - started
+        match = request.resolver_match
+        view = match.view_name if match else 'unmatched'
+        metrics.observe(
+            'yatube_http_request_duration_seconds', duration, view=view
+        )
+        metrics.inc('yatube_db_queries_total', counter.count, view=view)
+        return response
@@ -0,0 +1,112 @@
+"""Чтение с реплик и запись в основную базу.
+
+С реплик читают только страницы из REPLICA_VIEWS: их отмечает
+ReplicaPinMiddleware по имени адреса. Остальные запросы, сессии и
+пользователи всегда читаются из основной базы. После записи чтения
+этого пользователя идут в основную базу ещё REPLICA_PIN_SECONDS секунд,
+чтобы он сразу видел свои изменения: в пределах запроса это помнит
+поток, между запросами — cookie, которую ставит ReplicaPinMiddleware.
+Страницу, содержимое которой изменилось за те же секунды, все читают
+из основной базы (require_fresh): её HTML и ETag кэшируются под новым
+поколением, и старые строки реплики попали бы туда надолго.
+"""
+import random
+import threading
+import time
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+_state = threading.local()
+# Сессии и пользователи нужны свежими на любой странице.
+PRIMARY_APPS = {'auth', 'sessions'}
+
+
+def pin_primary(until=None):
+    _state.pinned_until = until or time.time() + settings.REPLICA_PIN_SECONDS
+
+
+def allow_replicas(allowed=True):
+    _state.replicas = allowed
+
+
+def reset(pinned_until=0):
+    _state.pinned_until = pinned_until
+    _state.written = False
+    _state.replicas = False
+
+
+def require_fresh(changed_at):
+    """Содержимое, изменённое в changed_at, реплики могли ещё не
+    получить: такие чтения этого запроса идут в основную базу."""
+    if changed_at > time.time() - settings.REPLICA_PIN_SECONDS:
+        allow_replicas(False)
+
+
+def written():
+    return getattr(_state, 'written', False)
+
+
+def pinned():
+    return getattr(_state, 'pinned_until', 0) > time.time()
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        replicas = settings.DATABASE_REPLICAS
+        if (not replicas or not getattr(_state, 'replicas', False)
+                or model._meta.app_label in PRIMARY_APPS or pinned()
+                or connections[DEFAULT_DB_ALIAS].in_atomic_block):
+            return DEFAULT_DB_ALIAS
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db not in {
+            None, DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS
+        }:
+            # Строки других баз (например, шардов) пишутся туда же.
+            return None
+        _state.written = True
+        pin_primary()
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS}
+        if {obj1._state.db, obj2._state.db} <= databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Реплики — копии основной базы, схему им не создают.
+        if db in settings.DATABASE_REPLICAS:
+            return False
+        return None
+
+
+class ReplicaPinMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        cookie = settings.REPLICA_PIN_COOKIE
+        try:
+            pinned_until = float(request.COOKIES.get(cookie, 0))
+        except ValueError:
+            pinned_until = 0
+        reset(pinned_until)
+        response = self.get_response(request)
+        if written():
+            response.set_cookie(
+                cookie,
+                str(getattr(_state, 'pinned_until')),
+                max_age=settings.REPLICA_PIN_SECONDS,
+                httponly=True,
+            )
+        reset()
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        allow_replicas(
+            request.resolver_match.view_name in settings.REPLICA_VIEWS
+        )
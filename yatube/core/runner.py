@@ -0,0 +1,51 @@
+"""Запуск тестов с кэшем и метриками во временном каталоге.
+
+Иначе тесты писали бы в cache.sqlite3 и metrics.sqlite3 рядом с
+проектом, которые читает работающий сайт. manage.py test подключает
+IsolatedStoresRunner, py.test — фикстура из conftest.py в корне.
+"""
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.test import override_settings
+from django.test.runner import DiscoverRunner
+
+from . import metrics
+
+
+@contextmanager
+def isolated_stores():
+    directory = tempfile.mkdtemp(prefix='yatube-tests-')
+    caches = {
+        alias: {
+            **config,
+            'LOCATION': os.path.join(directory, f'{alias}.sqlite3'),
+        }
+        for alias, config in settings.CACHES.items()
+    }
+    stores = override_settings(
+        CACHES=caches,
+        METRICS_STORE=os.path.join(directory, 'metrics.sqlite3'),
+    )
+    stores.enable()
+    try:
+        yield directory
+    finally:
+        # Накопленное сбрасывается во временный файл, а не в настоящий.
+        metrics.flush()
+        stores.disable()
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+class IsolatedStoresRunner(DiscoverRunner):
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.stores = isolated_stores()
+        self.stores.__enter__()
+
+    def teardown_test_environment(self, **kwargs):
+        self.stores.__exit__(None, None, None)
+        super().teardown_test_environment(**kwargs)
@@ -0,0 +1,442 @@
+import json
+import multiprocessing
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from http import HTTPStatus
+from io import StringIO
+from unittest import mock
+
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, connections
+from django.test import (Client, RequestFactory, SimpleTestCase, TestCase,
+                         TransactionTestCase, override_settings)
+from django.urls import resolve, reverse
+
+from posts.models import Post, User
+
+from . import metrics
+from .cache import SQLiteCache
+from . import routers
+from .db import sqlite_pragmas
+from .management.commands.sync_replicas import copy_database
+from .middleware import QueryRecorder
+
+
+class SQLiteCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.location = os.path.join(self.directory, 'cache.sqlite3')
+        self.cache = self.make_cache()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def make_cache(self, **options):
+        return SQLiteCache(self.location, {'OPTIONS': options})
+
+    def test_values_shared_between_instances(self):
+        """Значение, записанное одним экземпляром, видно другому."""
+        self.cache.set('key', {'value': 1})
+        self.assertEqual(self.make_cache().get('key'), {'value': 1})
+        self.assertTrue(self.cache.add('new', 1))
+        self.assertFalse(self.cache.add('new', 2))
+        self.assertEqual(self.cache.incr('new', 5), 6)
+
+    def test_many(self):
+        """set_many и delete_many работают одной пачкой."""
+        self.cache.set_many({'a': 1, 'b': 2, 'c': 3})
+        self.cache.delete_many(['a', 'c'])
+        self.assertEqual(self.cache.get_many(['a', 'b', 'c']), {'b': 2})
+
+    def test_expired_values_are_missing(self):
+        """Просроченное значение не возвращается."""
+        self.cache.set('key', 'value', timeout=0.05)
+        time.sleep(0.1)
+        self.assertIsNone(self.cache.get('key'))
+
+    def test_least_recently_used_evicted(self):
+        """При переполнении вытесняются давно не читавшиеся записи."""
+        cache = self.make_cache(MAX_ENTRIES=3, CULL_EVERY=1)
+        for key in ('a', 'b', 'c'):
+            cache.set(key, key)
+        cache.connection.execute(
+            "UPDATE cache SET accessed = 0 WHERE key LIKE '%a'"
+        )
+        cache.set('d', 'd')
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(cache.get_many(['b', 'c', 'd']),
+                         {'b': 'b', 'c': 'c', 'd': 'd'})
+
+    def test_size_cap(self):
+        """Кэш не выходит за MAX_SIZE байт."""
+        cache = self.make_cache(MAX_SIZE=4096, CULL_EVERY=1)
+        for i in range(20):
+            cache.set(f'key{i}', 'x' * 1024)
+        size = cache.connection.execute(
+            'SELECT SUM(size) FROM cache'
+        ).fetchone()[0]
+        self.assertLessEqual(size, 4096)
+
+    def test_single_flight(self):
+        """Промах по ключу пересчитывает только один поток."""
+        calls = []
+
+        def compute():
+            calls.append(1)
+            time.sleep(0.2)
+            return 'value'
+
+        results = []
+        threads = [
+            threading.Thread(
+                target=lambda: results.append(
+                    self.make_cache().get_or_set('key', compute)
+                )
+            )
+            for _ in range(4)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, ['value'] * 4)
+
+    def test_fragment_miss_waits_for_first_renderer(self):
+        """Фрагмент шаблона после промаха ждёт записи первым процессом."""
+        key = 'template.cache.index_page.hash'
+        self.assertIsNone(self.cache.get(key))
+        threading.Timer(0.1, self.cache.set, (key, 'html')).start()
+        self.assertEqual(self.make_cache().get(key), 'html')
+
+
+class BenchmarkViewsTests(TestCase):
+    def test_report_per_view(self):
+        """benchmark_views сохраняет замеры по каждому адресу в JSON."""
+        call_command(
+            'seed_yatube', users=3, groups=1, posts=5, comments=2,
+            follows=2, stdout=StringIO(),
+        )
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'bench.json')
+        with mock.patch(
+            'core.management.commands.benchmark_views.URLCONFS',
+            ('posts.urls', 'about.urls'),
+        ):
+            call_command(
+                'benchmark_views', repeat=2, output=path,
+                stdout=StringIO(), stderr=StringIO(),
+            )
+        with open(path, encoding='utf-8') as stream:
+            report = json.load(stream)
+        self.assertEqual(report['dataset']['posts'], 5)
+        views = {result['view']: result for result in report['views']}
+        self.assertIn('about:tech', views)
+        index = views['posts:index']
+        self.assertEqual(index['status'], 200)
+        self.assertLessEqual(index['p50_ms'], index['p95_ms'])
+        self.assertGreater(index['queries'], 0)
+        self.assertGreater(index['peak_memory_kb'], 0)
+
+
+@override_settings(
+    SQL_INSTRUMENTATION=True,
+    SQL_QUERY_BUDGETS={'posts:profile': 1},
+)
+class QueryInstrumentationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_server_timing_and_log(self):
+        """Ответ содержит Server-Timing, запрос пишется в журнал."""
+        with self.assertLogs('core.sql', 'INFO') as logs:
+            response = self.client.get(reverse('about:tech'))
+        self.assertIn('db;dur=', response['Server-Timing'])
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record['view'], 'about:tech')
+        self.assertEqual(record['status'], 200)
+
+    def test_budget_violation_and_duplicates(self):
+        """Превышение бюджета и повторы запросов попадают в журнал."""
+        author = User.objects.create_user(username='author')
+        Post.objects.bulk_create(
+            Post(author=author, text=f'Пост {i}') for i in range(3)
+        )
+        with self.assertLogs('core.sql', 'WARNING') as logs:
+            self.client.get(reverse('posts:profile', args=['author']))
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record['budget'], {'queries': 1})
+        self.assertGreater(record['queries'], 1)
+        self.assertLessEqual(len(record['slowest']), 3)
+
+    @override_settings(SQL_QUERY_BUDGETS={'posts:index': 0})
+    def test_zero_budget(self):
+        """Бюджет 0 запрещает любые запросы, а не отключает проверку."""
+        with self.assertLogs('core.sql', 'WARNING') as logs:
+            self.client.get(reverse('posts:index'))
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record['budget'], {'queries': 0})
+
+    def test_recorder_counts_duplicates(self):
+        """Одинаковые запросы считаются повторами."""
+        recorder = QueryRecorder()
+        with connection.execute_wrapper(recorder):
+            for _ in range(3):
+                User.objects.filter(pk=1).exists()
+        summary = recorder.summary(slowest=1)
+        self.assertEqual(summary['queries'], 3)
+        self.assertEqual(summary['duplicates'], 2)
+        self.assertEqual(summary['repeated'][0]['count'], 3)
+
+
+METRICS_DIR = tempfile.mkdtemp()
+
+
+@override_settings(
+    METRICS_STORE=os.path.join(METRICS_DIR, 'metrics.sqlite3'),
+    METRICS_FLUSH_INTERVAL=0,
+)
+class MetricsTests(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(METRICS_DIR, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        metrics.clear()
+
+    def staff_client(self):
+        client = Client()
+        client.force_login(User.objects.create_user(
+            username='staff', is_staff=True
+        ))
+        return client
+
+    def test_request_and_cache_metrics(self):
+        """На /metrics есть время ответа, запросы и попадания в кэш."""
+        author = User.objects.create_user(username='author')
+        Post.objects.create(author=author, text='Текст')
+        self.client.get(reverse('posts:index'))
+        self.client.get(reverse('posts:index'))
+        response = self.staff_client().get(reverse('metrics'))
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        text = response.content.decode()
+        self.assertIn(
+            'yatube_http_request_duration_seconds_count'
+            '{view="posts:index"} 2', text
+        )
+        self.assertIn(
+            'yatube_http_request_duration_seconds_bucket'
+            '{le="+Inf",view="posts:index"} 2', text
+        )
+        self.assertIn('yatube_db_queries_total{view="posts:index"}', text)
+        self.assertIn('yatube_cache_hit_ratio{cache="index_page"} 0.5', text)
+
+    def test_counters_shared_between_processes(self):
+        """Приращения из другого процесса попадают в общие суммы."""
+        metrics.inc('yatube_db_queries_total', 2, view='test')
+        process = multiprocessing.get_context('fork').Process(
+            target=metrics.inc,
+            args=('yatube_db_queries_total', 3),
+            kwargs={'view': 'test'},
+        )
+        process.start()
+        process.join()
+        self.assertIn(
+            'yatube_db_queries_total{view="test"} 5', metrics.render()
+        )
+
+    @override_settings(METRICS_ALLOWED_IPS=['10.0.0.1'], METRICS_TOKEN='s3')
+    def test_access(self):
+        """/metrics видят персонал, разрешённые адреса и владелец токена."""
+        url = reverse('metrics')
+        cases = (
+            (self.client, {}, HTTPStatus.FORBIDDEN),
+            (self.client, {'HTTP_AUTHORIZATION': 'Bearer s4'},
+             HTTPStatus.FORBIDDEN),
+            (self.client, {'HTTP_AUTHORIZATION': 'Bearer s3'}, HTTPStatus.OK),
+            (self.client, {'REMOTE_ADDR': '10.0.0.1'}, HTTPStatus.OK),
+            (self.staff_client(), {}, HTTPStatus.OK),
+        )
+        for client, extra, status in cases:
+            with self.subTest(extra=extra):
+                self.assertEqual(client.get(url, **extra).status_code, status)
+
+    def test_unknown_metric(self):
+        """Метрику без описания в METRICS записать нельзя."""
+        with self.assertRaises(ValueError):
+            metrics.inc('yatube_unknown_total')
+        with self.assertRaises(ValueError):
+            metrics.observe('yatube_unknown_seconds', 1)
+        for name in ('yatube_image_resize_total',
+                     'yatube_image_resize_seconds'):
+            with self.subTest(name=name):
+                self.assertIn(f'# TYPE {name} ', metrics.render())
+
+
+class SQLitePragmaTests(TestCase):
+    def test_pragmas_applied_to_connection(self):
+        """Соединение получает PRAGMA из SQLITE_PRAGMAS."""
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA synchronous')
+            self.assertEqual(cursor.fetchone()[0], 1)
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], 5000)
+
+    @override_settings(SQLITE_PRAGMAS={'synchronous': 'NORMAL'})
+    def test_database_overrides(self):
+        """PRAGMAS в DATABASES дополняют и переопределяют общие."""
+        self.assertEqual(
+            sqlite_pragmas({'PRAGMAS': {'synchronous': 'OFF', 'x': 1}}),
+            {'synchronous': 'OFF', 'x': 1},
+        )
+
+    def test_benchmark_reports_both_configurations(self):
+        """benchmark_sqlite замеряет исходную и настроенную базу."""
+        out = StringIO()
+        call_command(
+            'benchmark_sqlite', readers=1, writers=1, duration=0.2,
+            rows=100, stdout=out,
+        )
+        self.assertIn('baseline', out.getvalue())
+        self.assertIn('tuned', out.getvalue())
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class ReplicaRouterTests(SimpleTestCase):
+    def setUp(self):
+        self.router = routers.ReplicaRouter()
+        routers.reset()
+        routers.allow_replicas()
+        self.addCleanup(routers.reset)
+
+    def test_reads_go_to_replica_until_write(self):
+        """Чтения идут на реплику, после записи — в основную базу."""
+        self.assertEqual(self.router.db_for_read(Post), 'replica')
+        self.assertEqual(self.router.db_for_write(Post), 'default')
+        self.assertEqual(self.router.db_for_read(Post), 'default')
+
+    @override_settings(REPLICA_PIN_SECONDS=0)
+    def test_pin_expires(self):
+        """Привязка к основной базе истекает через заданное время."""
+        self.router.db_for_write(Post)
+        self.assertEqual(self.router.db_for_read(Post), 'replica')
+
+    def test_pin_restored_from_cookie(self):
+        """Срок привязки из cookie действует в следующем запросе."""
+        routers.reset(pinned_until=time.time() + 10)
+        self.assertEqual(self.router.db_for_read(Post), 'default')
+
+    def test_only_marked_views_and_models(self):
+        """Без отметки страницы, а также сессии и пользователи читаются
+        из основной базы."""
+        self.assertEqual(self.router.db_for_read(User), 'default')
+        self.assertEqual(self.router.db_for_read(Session), 'default')
+        routers.allow_replicas(False)
+        self.assertEqual(self.router.db_for_read(Post), 'default')
+
+    def test_replicas_for_read_only_views(self):
+        """С реплик читают только страницы из REPLICA_VIEWS."""
+        middleware = routers.ReplicaPinMiddleware(None)
+        cases = (
+            (reverse('posts:index'), 'replica'),
+            (reverse('posts:profile', args=['author']), 'replica'),
+            (reverse('posts:post_create'), 'default'),
+            (reverse('posts:search'), 'default'),
+        )
+        for url, alias in cases:
+            with self.subTest(url=url):
+                routers.reset()
+                request = RequestFactory().get(url)
+                request.resolver_match = resolve(url)
+                middleware.process_view(request, None, (), {})
+                self.assertEqual(self.router.db_for_read(Post), alias)
+
+    def test_recent_changes_read_from_primary(self):
+        """Содержимое, изменённое недавно, читается из основной базы."""
+        routers.require_fresh(time.time() - 60)
+        self.assertEqual(self.router.db_for_read(Post), 'replica')
+        routers.require_fresh(time.time())
+        self.assertEqual(self.router.db_for_read(Post), 'default')
+
+    def test_no_migrations_on_replicas(self):
+        self.assertFalse(self.router.allow_migrate('replica', 'posts'))
+        self.assertIsNone(self.router.allow_migrate('default', 'posts'))
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class ReplicaFreshnessTests(TransactionTestCase):
+    """Реплика — отдельная пустая база, то есть заведомо отстала."""
+    databases = {'default', 'replica'}
+
+    @classmethod
+    def setUpClass(cls):
+        connections.databases['replica'] = {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': ':memory:',
+        }
+        with override_settings(DATABASE_REPLICAS=[]):
+            call_command('migrate', database='replica', verbosity=0)
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        connections['replica'].close()
+        del connections.databases['replica']
+        delattr(connections._connections, 'replica')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_visitor_sees_new_post(self):
+        """Посетитель без привязки к основной базе видит только что
+        добавленный пост, и тот же ответ не отдаётся по старому ETag."""
+        author = User.objects.create_user(username='author')
+        response = self.client.get(reverse('posts:index'))
+        etag = response['ETag']
+        Post.objects.create(author=author, text='Свежий пост')
+        response = Client().get(
+            reverse('posts:index'), HTTP_IF_NONE_MATCH=etag
+        )
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertContains(response, 'Свежий пост')
+        self.assertNotIn('pin_primary', response.cookies)
+
+
+class ReplicaPinMiddlewareTests(TestCase):
+    def test_cookie_set_after_write(self):
+        """Запрос с записью ставит cookie привязки, чтение — нет."""
+        response = self.client.get(reverse('about:tech'))
+        self.assertNotIn('pin_primary', response.cookies)
+        user = User.objects.create_user(username='writer')
+        User.objects.create_user(username='author')
+        self.client.force_login(user)
+        response = self.client.get(
+            reverse('posts:profile_follow', kwargs={'username': 'author'})
+        )
+        self.assertIn('pin_primary', response.cookies)
+        self.assertFalse(routers.pinned())
+
+    def test_copy_database(self):
+        """sync_replicas копирует файл базы целиком."""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        source = os.path.join(directory, 'primary.sqlite3')
+        target = os.path.join(directory, 'replica.sqlite3')
+        with sqlite3.connect(source) as primary:
+            primary.execute('CREATE TABLE t (x INTEGER)')
+            primary.execute('INSERT INTO t VALUES (42)')
+        copy_database(source, target)
+        with sqlite3.connect(target) as replica:
+            self.assertEqual(
+                replica.execute('SELECT x FROM t').fetchall(), [(42,)]
+            )
@@ -1,5 +1,11 @@
+import hmac
+
+from django.conf import settings
+from django.http import HttpResponse
 from django.shortcuts import render
 
+from . import metrics as metrics_store
+
 
 def page_not_found(request, exception):
     return render(request,
@@ -18,3 +24,23 @@ def permission_denied(request, exception):
 
 def csrf_failure(request, reason=''):
     return render(request, 'core/403csrf.html')
+
+
+def metrics_allowed(request):
+    if request.user.is_staff:
+        return True
+    if request.META.get('REMOTE_ADDR') in settings.METRICS_ALLOWED_IPS:
+        return True
+    token = settings.METRICS_TOKEN
+    return bool(token) and hmac.compare_digest(
+        request.META.get('HTTP_AUTHORIZATION', ''), f'Bearer {token}'
+    )
+
+
+def metrics(request):
+    if not metrics_allowed(request):
+        return permission_denied(request, None)
+    return HttpResponse(
+        metrics_store.render(),
+        content_type='text/plain; version=0.0.4; charset=utf-8',
+    )
@@ -1,9 +1,26 @@
 from django.contrib import admin
+from django.core.exceptions import ImproperlyConfigured
 
+from . import sharding
 from .models import Comment, Follow, Group, Post
+from .search import matching_posts
 
 
-class PostAdmin(admin.ModelAdmin):
+class ShardedModelAdmin(admin.ModelAdmin):
+    """Список админки читает одну базу, а при POST_SHARDS посты и
+    комментарии лежат на шардах: пустой список из default вводил бы
+    в заблуждение."""
+
+    def get_queryset(self, request):
+        if sharding.enabled():
+            raise ImproperlyConfigured(
+                f'{self.model._meta.verbose_name_plural} в админке '
+                f'недоступны при POST_SHARDS.'
+            )
+        return super().get_queryset(request)
+
+
+class PostAdmin(ShardedModelAdmin):
     list_display = (
         'pk',
         'text',
@@ -16,6 +33,14 @@ class PostAdmin(admin.ModelAdmin):
     list_filter = ('pub_date',)
     empty_value_display = '-пусто-'
 
+    def get_search_results(self, request, queryset, search_term):
+        matching = matching_posts(search_term)
+        if matching is None:
+            return super().get_search_results(
+                request, queryset, search_term
+            )
+        return queryset.filter(pk__in=matching), False
+
 
 class GroupAdmin(admin.ModelAdmin):
     list_display = (
@@ -28,7 +53,7 @@ class GroupAdmin(admin.ModelAdmin):
     empty_value_display = '-пусто-'
 
 
-class CommentAdmin(admin.ModelAdmin):
+class CommentAdmin(ShardedModelAdmin):
     list_display = ('post', 'author', 'text', 'created')
     search_fields = ('text',)
     list_filter = ('created',)
@@ -0,0 +1,52 @@
+"""Помощники массовой загрузки: bulk_create не вызывает сигналы,
+поэтому производные данные после неё пересчитываются здесь."""
+from contextlib import contextmanager
+
+from django.core.management import call_command
+
+from . import counts, feed, generations, search, sharding
+from .models import Comment, Post
+
+DATE_FIELDS = (
+    (Post, 'pub_date'),
+    (Comment, 'created'),
+)
+
+
+@contextmanager
+def explicit_dates():
+    """Сохраняет переданные даты вместо auto_now_add."""
+    fields = [model._meta.get_field(name) for model, name in DATE_FIELDS]
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+def refresh_denormalized(author_ids=(), group_ids=(), follower_ids=(),
+                         post_ids=(), full=False, stdout=None):
+    """Пересчитывает затронутое загрузкой: посты и счётчики авторов
+    author_ids, ленты подписчиков follower_ids и подписчиков этих
+    авторов, комментарии к постам post_ids. full=True пересчитывает
+    всё по сайту."""
+    sharding.advance_sequences()
+    if full:
+        search.rebuild_index()
+        call_command('reconcile_author_stats', stdout=stdout)
+        feed.backfill_all()
+    else:
+        search.reindex(author_ids, post_ids)
+        users = sorted({*author_ids, *follower_ids})
+        if users:
+            call_command('reconcile_author_stats', users=users, stdout=stdout)
+        feed.backfill_all(follower_ids, author_ids)
+    counts.forget(group_ids)
+    generations.bump(
+        generations.INDEX,
+        *(generations.profile_scope(pk) for pk in author_ids),
+        *(generations.group_scope(pk) for pk in group_ids),
+        *(generations.follow_scope(pk) for pk in follower_ids),
+    )
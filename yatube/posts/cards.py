@@ -0,0 +1,38 @@
+"""Кэш готового HTML карточки поста (includes/post.html).
+
+Ключ содержит updated_at, поэтому изменённый пост получает новый ключ;
+старые записи удаляются сигналами при правке и удалении поста.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+TEMPLATE = 'includes/post.html'
+
+
+def card_key(post_id, updated_at, link):
+    return f'post_card:{post_id}:{updated_at.timestamp()}:{int(link)}'
+
+
+def render_cards(posts, link=False):
+    posts = list(posts)
+    keys = [card_key(post.pk, post.updated_at, link) for post in posts]
+    cards = cache.get_many(keys)
+    missing = {}
+    for key, post in zip(keys, posts):
+        if key not in cards:
+            missing[key] = render_to_string(
+                TEMPLATE, {'post': post, 'link': link}
+            )
+    if missing:
+        cache.set_many(missing, settings.POST_CARD_CACHE_TIMEOUT)
+        cards.update(missing)
+    return [mark_safe(cards[key]) for key in keys]
+
+
+def evict(post_id, updated_at):
+    if updated_at is not None:
+        cache.delete_many(
+            [card_key(post_id, updated_at, link) for link in (False, True)]
+        )
@@ -0,0 +1,76 @@
+"""Число постов в лентах для пагинатора без COUNT(*) на каждый запрос.
+
+Общая лента и ленты групп: число в кэше, которое сигналы увеличивают
+и уменьшают; при промахе оно один раз считается точно. Профиль и
+подписки: суммы из AuthorStats.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Sum
+
+from . import sharding
+from .models import AuthorStats, Post
+
+INDEX_KEY = 'feed_count:index'
+
+
+def group_key(group_id):
+    return f'feed_count:group:{group_id}'
+
+
+def _cached(key, queryset):
+    count = cache.get(key)
+    if count is None:
+        count = queryset.count()
+        cache.add(key, count, settings.FEED_COUNT_TIMEOUT)
+    return count
+
+
+def index_count():
+    return _cached(INDEX_KEY, sharding.scatter(Post.objects.all()))
+
+
+def group_count(group_id):
+    return _cached(
+        group_key(group_id),
+        sharding.scatter(Post.objects.filter(group=group_id)),
+    )
+
+
+def follow_count(user):
+    return AuthorStats.objects.filter(
+        author__following__user=user
+    ).aggregate(total=Sum('posts_count'))['total'] or 0
+
+
+def _add(key, delta):
+    try:
+        cache.incr(key, delta)
+    except ValueError:
+        # Числа нет в кэше: его посчитают при следующем запросе.
+        pass
+
+
+def post_added(group_id):
+    _add(INDEX_KEY, 1)
+    if group_id is not None:
+        _add(group_key(group_id), 1)
+
+
+def post_removed(group_id):
+    _add(INDEX_KEY, -1)
+    if group_id is not None:
+        _add(group_key(group_id), -1)
+
+
+def post_moved(old_group_id, group_id):
+    if old_group_id == group_id:
+        return
+    if old_group_id is not None:
+        _add(group_key(old_group_id), -1)
+    if group_id is not None:
+        _add(group_key(group_id), 1)
+
+
+def forget(group_ids=()):
+    cache.delete_many([INDEX_KEY, *map(group_key, group_ids)])
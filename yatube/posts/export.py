@@ -0,0 +1,95 @@
+"""Потоковая выгрузка в JSONL в формате, который читает import_yatube."""
+import base64
+import json
+
+from django.core.files.storage import default_storage
+
+from . import sharding
+from .models import Comment, Follow, Group, Post
+
+CHUNK_SIZE = 500
+IMAGE_MODES = ('path', 'inline')
+
+
+def group_records(groups):
+    for group in groups.values('slug', 'title', 'description').iterator(
+        chunk_size=CHUNK_SIZE
+    ):
+        yield {'type': 'group', **group}
+
+
+def rows(queryset, *fields):
+    """Строки выборки со всех шардов, на каждом по возрастанию pk."""
+    for shard_queryset in sharding.each(queryset):
+        yield from shard_queryset.order_by('pk').values(*fields).iterator(
+            chunk_size=CHUNK_SIZE
+        )
+
+
+def post_records(posts, images='path'):
+    for row in rows(
+        posts, 'pk', 'author__username', 'group__slug', 'text', 'pub_date',
+        'image',
+    ):
+        record = {
+            'type': 'post',
+            'id': row['pk'],
+            'author': row['author__username'],
+            'text': row['text'],
+            'pub_date': row['pub_date'].isoformat(),
+        }
+        if row['group__slug']:
+            record['group'] = row['group__slug']
+        if row['image']:
+            record['image'] = row['image']
+            if images == 'inline':
+                record['image_data'] = read_image(row['image'])
+        yield record
+
+
+def read_image(name):
+    try:
+        with default_storage.open(name) as image:
+            return base64.b64encode(image.read()).decode()
+    except OSError:
+        return None
+
+
+def comment_records(comments):
+    for row in rows(
+        comments, 'pk', 'post_id', 'author__username', 'text', 'created'
+    ):
+        yield {
+            'type': 'comment',
+            'id': row['pk'],
+            'post': row['post_id'],
+            'author': row['author__username'],
+            'text': row['text'],
+            'created': row['created'].isoformat(),
+        }
+
+
+def follow_records(follows):
+    rows = follows.values_list(
+        'user__username', 'author__username'
+    ).iterator(chunk_size=CHUNK_SIZE)
+    for user, author in rows:
+        yield {'type': 'follow', 'user': user, 'author': author}
+
+
+def user_records(user, images='path'):
+    yield from post_records(Post.objects.filter(author=user), images)
+    yield from comment_records(Comment.objects.filter(author=user))
+    yield from follow_records(Follow.objects.filter(user=user))
+
+
+def site_records(images='path'):
+    yield from group_records(Group.objects.all())
+    yield from post_records(Post.objects.all(), images)
+    yield from comment_records(Comment.objects.all())
+    yield from follow_records(Follow.objects.all())
+
+
+def jsonl(records):
+    for record in records:
+        yield json.dumps(record, ensure_ascii=False) + '\n'
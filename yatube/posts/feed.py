@@ -0,0 +1,118 @@
+from django.conf import settings
+from django.db.models import Q
+
+from . import sharding
+from .models import AuthorStats, FeedEntry, Follow, Post
+
+
+def is_pulled(author_id):
+    """Порог FEED_FANOUT_LIMIT везде сравнивается с AuthorStats."""
+    return AuthorStats.objects.filter(
+        author=author_id,
+        followers_count__gt=settings.FEED_FANOUT_LIMIT,
+    ).exists()
+
+
+def pull_authors(user):
+    """Авторы из подписок, чьи посты не раскладываются по лентам,
+    а подтягиваются при чтении."""
+    return Follow.objects.filter(
+        user=user,
+        author__stats__followers_count__gt=settings.FEED_FANOUT_LIMIT,
+    ).values_list('author', flat=True)
+
+
+def follow_feed(user):
+    if sharding.enabled():
+        # Записи ленты ссылаются на посты, а те лежат на шардах.
+        return sharding.scatter_authors(
+            Post.objects.all(),
+            Follow.objects.filter(user=user).values_list('author', flat=True),
+        )
+    pulled = list(pull_authors(user))
+    if not pulled:
+        return Post.objects.filter(
+            feed_entries__user=user
+        ).order_by('-feed_entries__pub_date')
+    entries = FeedEntry.objects.filter(user=user).values('post')
+    return Post.objects.filter(Q(pk__in=entries) | Q(author__in=pulled))
+
+
+def fan_out(post):
+    if sharding.enabled():
+        return
+    if is_pulled(post.author_id):
+        return
+    followers = Follow.objects.filter(
+        author=post.author_id
+    ).values_list('user', flat=True)
+    FeedEntry.objects.bulk_create(
+        (
+            FeedEntry(
+                user_id=user_id,
+                post=post,
+                author_id=post.author_id,
+                pub_date=post.pub_date,
+            )
+            for user_id in followers.iterator()
+        ),
+        batch_size=settings.FEED_BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def backfill(user_id, author_id):
+    if sharding.enabled():
+        return
+    if is_pulled(author_id):
+        return
+    posts = Post.objects.filter(
+        author=author_id
+    ).values_list('pk', 'pub_date')
+    FeedEntry.objects.bulk_create(
+        (
+            FeedEntry(
+                user_id=user_id,
+                post_id=post_id,
+                author_id=author_id,
+                pub_date=pub_date,
+            )
+            for post_id, pub_date in posts.iterator()
+        ),
+        batch_size=settings.FEED_BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def prune(user_id, author_id):
+    FeedEntry.objects.filter(user=user_id, author=author_id).delete()
+
+
+def follower_removed(author_id):
+    """Автор опустился до FEED_FANOUT_LIMIT подписчиков: его посты снова
+    раскладываются по лентам, в том числе написанные, пока их
+    подтягивали при чтении."""
+    if sharding.enabled() or not AuthorStats.objects.filter(
+        author=author_id, followers_count=settings.FEED_FANOUT_LIMIT
+    ).exists():
+        return
+    followers = Follow.objects.filter(
+        author=author_id
+    ).values_list('user', flat=True)
+    for user_id in followers.iterator():
+        backfill(user_id, author_id)
+
+
+def backfill_all(user_ids=None, author_ids=None):
+    """Дозаполняет ленты по подпискам; с user_ids и author_ids — только
+    по подпискам этих подписчиков и на этих авторов."""
+    follows = Follow.objects.all()
+    if user_ids is not None or author_ids is not None:
+        follows = follows.filter(
+            Q(user__in=list(user_ids or ()))
+            | Q(author__in=list(author_ids or ()))
+        )
+    for user_id, author_id in follows.values_list(
+        'user', 'author'
+    ).iterator():
+        backfill(user_id, author_id)
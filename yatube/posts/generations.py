@@ -0,0 +1,51 @@
+"""Поколения содержимого страниц.
+
+Поколение области (лента, группа, профиль, пост) — время последнего
+изменения её содержимого. Оно входит в ключи кэша фрагментов, поэтому
+фрагменты живут долго и устаревают сразу при изменении данных.
+"""
+import time
+
+from django.core.cache import cache
+
+KEY_PREFIX = 'generation'
+INDEX = 'index'
+
+
+def group_scope(group_id):
+    return f'group:{group_id}'
+
+
+def profile_scope(author_id):
+    return f'profile:{author_id}'
+
+
+def follow_scope(user_id):
+    return f'follow:{user_id}'
+
+
+def post_scope(post_id):
+    return f'post:{post_id}'
+
+
+def _key(scope):
+    return f'{KEY_PREFIX}:{scope}'
+
+
+def stamps(*scopes):
+    keys = [_key(scope) for scope in scopes]
+    found = cache.get_many(keys)
+    missing = {key: time.time() for key in keys if key not in found}
+    if missing:
+        cache.set_many(missing, None)
+        found.update(missing)
+    return [found[key] for key in keys]
+
+
+def generation(*scopes):
+    return '-'.join('%x' % int(stamp * 10 ** 6) for stamp in stamps(*scopes))
+
+
+def bump(*scopes):
+    now = time.time()
+    cache.set_many({_key(scope): now for scope in scopes}, None)
@@ -0,0 +1,189 @@
+"""Обработка картинок постов при загрузке.
+
+Оригинал поворачивается по EXIF, теряет метаданные и уменьшается до
+IMAGE_MAX_SIZE по длинной стороне. При сохранении поста в нём
+запоминаются размеры картинки и крошечная размытая заглушка. Копии
+шириной IMAGE_WIDTHS в WebP и JPEG с пропорциями карточки отдаёт
+posts.resize; после сохранения поста они создаются заранее в фоновом
+пуле из IMAGE_WORKERS потоков с очередью не длиннее IMAGE_QUEUE_SIZE.
+"""
+import base64
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+from PIL import Image, ImageFilter, ImageOps
+
+from core import metrics
+
+from . import resize
+
+logger = logging.getLogger(__name__)
+
+PLACEHOLDER_WIDTH = 16
+# Форматы с анимацией. В MPO (снимки камер и телефонов) лишние кадры —
+# превью и стереопары, такой файл сохраняется как JPEG первого кадра.
+ANIMATED_FORMATS = {'GIF', 'PNG', 'WEBP'}
+
+_executor = None
+_executor_lock = threading.Lock()
+_slots = threading.BoundedSemaphore(settings.IMAGE_QUEUE_SIZE)
+
+
+def normalize(upload):
+    """Файл, который сохраняется вместо загруженного."""
+    upload.seek(0)
+    with Image.open(upload) as image:
+        if (image.format in ANIMATED_FORMATS
+                and getattr(image, 'is_animated', False)):
+            # Анимацию пересохранение оставило бы одним кадром.
+            upload.seek(0)
+            return upload
+        image_format = 'JPEG' if image.format == 'MPO' else image.format
+        icc_profile = image.info.get('icc_profile')
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((settings.IMAGE_MAX_SIZE, settings.IMAGE_MAX_SIZE))
+        buffer = BytesIO()
+        image.save(
+            buffer, image_format, icc_profile=icc_profile,
+            **resize.save_options(image_format),
+        )
+    return ContentFile(buffer.getvalue(), name=upload.name)
+
+
+def create_derivatives(name, image_width=None):
+    """Заранее кладёт в кэш resize копии для srcset карточки."""
+    return [
+        resize.ensure(resize.geometry(*resize.card_size(width), extension),
+                      name)
+        for width in card_widths(image_width)
+        for extension in resize.FORMATS
+    ]
+
+
+def generate(name, image_width=None):
+    started = time.perf_counter()
+    try:
+        create_derivatives(name, image_width)
+    except Exception:
+        logger.exception('Не удалось нарезать копии %s', name)
+        return
+    metrics.observe(
+        'yatube_image_derivatives_seconds', time.perf_counter() - started
+    )
+
+
+def _executor_instance():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.IMAGE_WORKERS,
+                thread_name_prefix='images',
+            )
+        return _executor
+
+
+def _run(name, image_width):
+    try:
+        generate(name, image_width)
+    finally:
+        close_old_connections()
+        _slots.release()
+
+
+def submit(name, image_width=None):
+    """Ставит нарезку копий в очередь; при переполненной очереди копии
+    создаст posts.resize при первом запросе."""
+    if not _slots.acquire(blocking=False):
+        logger.warning('Очередь картинок переполнена, пропускаю %s', name)
+        return
+    try:
+        _executor_instance().submit(_run, name, image_width)
+    except RuntimeError:
+        _slots.release()
+        raise
+
+
+def describe(source):
+    """Ширина, высота и заглушка в data URI для файла картинки."""
+    with Image.open(source) as picture:
+        width, height = picture.size
+        picture = resize.flatten(ImageOps.exif_transpose(picture))
+    picture = ImageOps.fit(
+        picture, resize.card_size(PLACEHOLDER_WIDTH), Image.BILINEAR
+    ).filter(
+        ImageFilter.GaussianBlur(1)
+    )
+    buffer = BytesIO()
+    picture.save(buffer, 'WEBP', quality=30)
+    data = base64.b64encode(buffer.getvalue()).decode()
+    return width, height, f'data:image/webp;base64,{data}'
+
+
+def read_details(name):
+    with default_storage.open(name) as source:
+        return describe(source)
+
+
+def fill_details(post):
+    image = post.image
+    details = (None, None, '')
+    if image:
+        try:
+            if image._committed:
+                details = read_details(image.name)
+            else:
+                image.open('rb')
+                details = describe(image)
+                # Загруженный файл ещё предстоит сохранить целиком.
+                image.seek(0)
+        except Exception:
+            logger.exception('Не удалось прочитать %s', image.name)
+    post.image_width, post.image_height, post.image_placeholder = details
+
+
+def schedule(post):
+    if not settings.IMAGE_PREGENERATE or not post.image:
+        return
+    if post.image.name == getattr(post, '_old_image', None):
+        return
+    name, width = post.image.name, post.image_width
+    transaction.on_commit(lambda: submit(name, width))
+
+
+def card_widths(image_width=None):
+    """Ширины копий для srcset: без увеличения картинки сверх её
+    собственной ширины, но хотя бы самая узкая."""
+    widths = sorted(settings.IMAGE_WIDTHS)
+    if image_width is None:
+        return widths
+    return [width for width in widths if width <= image_width] or widths[:1]
+
+
+def srcset(name, extension, widths):
+    return ', '.join(
+        f'{resize.url(resize.geometry(*size, extension), name)} {size[0]}w'
+        for size in map(resize.card_size, widths)
+    )
+
+
+def sources(name, image_width=None):
+    """src самой широкой JPEG-копии, её размеры и srcset по форматам."""
+    if not name:
+        return None
+    widths = card_widths(image_width)
+    width, height = resize.card_size(widths[-1])
+    return {
+        'src': resize.url(resize.geometry(width, height, 'jpeg'), name),
+        'width': width,
+        'height': height,
+        **{extension: srcset(name, extension, widths)
+           for extension in resize.FORMATS},
+    }
@@ -0,0 +1,32 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from posts import resize
+
+
+class Command(BaseCommand):
+    help = (
+        'Удаляет из кэша копий картинок те, что дольше всех не читали, '
+        'пока кэш не уложится в IMAGE_RESIZE_MAX_SIZE.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--max-size', type=int, default=None,
+            help='Предел в байтах вместо IMAGE_RESIZE_MAX_SIZE.',
+        )
+        parser.add_argument(
+            '--clear', action='store_true', help='Удалить все копии.'
+        )
+
+    def handle(self, *args, **options):
+        max_size = options['max_size']
+        if options['clear']:
+            max_size = 0
+        elif max_size is None:
+            max_size = settings.IMAGE_RESIZE_MAX_SIZE
+        removed, freed = resize.cull(max_size)
+        self.stdout.write(
+            f'Удалено копий: {removed}, '
+            f'освобождено: {freed / 1024 / 1024:.1f} МБ'
+        )
@@ -0,0 +1,56 @@
+import re
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from posts.feed import follow_feed
+from posts.models import Comment, Follow, Post
+from posts.utils import POSTS_PER_PAGE
+
+FULL_SCAN = re.compile(r'\bSCAN (TABLE )?\w+\b(?! USING)')
+
+
+def feed_queries(sample_id=1):
+    """Основные запросы страниц: имя страницы и queryset."""
+    return {
+        'posts:index': Post.objects.for_feed(),
+        'posts:group_list': Post.objects.filter(group=sample_id).for_feed(),
+        'posts:profile': Post.objects.filter(author=sample_id).for_feed(),
+        'posts:profile following': Follow.objects.filter(
+            user=sample_id, author=sample_id
+        ),
+        'posts:post_detail comments': Comment.objects.filter(
+            post=sample_id
+        ).select_related('author'),
+        'posts:follow_index': follow_feed(sample_id).for_feed(),
+    }
+
+
+def full_scans(queryset):
+    sql, params = queryset[:POSTS_PER_PAGE].query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+        plan = [row[-1] for row in cursor.fetchall()]
+    return plan, [line for line in plan if FULL_SCAN.search(line)]
+
+
+class Command(BaseCommand):
+    help = ('Проверяет планы основных запросов страниц '
+            'и сообщает о полных просмотрах таблиц.')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('EXPLAIN QUERY PLAN доступен только в SQLite')
+        failed = []
+        for name, queryset in feed_queries().items():
+            plan, scans = full_scans(queryset)
+            self.stdout.write(name)
+            for line in plan:
+                self.stdout.write(f'    {line}')
+            if scans:
+                failed.append(name)
+        if failed:
+            raise CommandError(
+                'Полный просмотр таблицы: ' + ', '.join(failed)
+            )
+        self.stdout.write(self.style.SUCCESS('Полных просмотров нет'))
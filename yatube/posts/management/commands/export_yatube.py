@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from posts.export import IMAGE_MODES, jsonl, site_records
+
+
+class Command(BaseCommand):
+    help = ('Выгружает группы, посты, комментарии и подписки в JSONL '
+            'для import_yatube.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--output', '-o',
+            help='Файл для выгрузки; по умолчанию стандартный вывод.'
+        )
+        parser.add_argument(
+            '--images', choices=IMAGE_MODES, default='path',
+            help='Путь к картинке или её содержимое в base64.'
+        )
+
+    def handle(self, *args, **options):
+        lines = jsonl(site_records(options['images']))
+        if options['output'] is None:
+            for line in lines:
+                self.stdout.write(line, ending='')
+            return
+        count = 0
+        with open(options['output'], 'w', encoding='utf-8') as stream:
+            for line in lines:
+                stream.write(line)
+                count += 1
+        self.stdout.write(f'Выгружено записей: {count}')
@@ -0,0 +1,209 @@
+import base64
+import csv
+import json
+import time
+from itertools import islice
+
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from posts import sharding
+from posts.bulk import explicit_dates, refresh_denormalized
+from posts.models import Comment, Follow, Group, Post, User
+
+# Порядок вставки внутри пачки: сначала то, на что ссылаются остальные.
+RECORD_TYPES = ('group', 'post', 'comment', 'follow')
+
+
+def read_jsonl(stream):
+    for line in stream:
+        line = line.strip()
+        if line:
+            yield json.loads(line)
+
+
+def read_csv(stream):
+    for row in csv.DictReader(stream):
+        yield {key: value for key, value in row.items() if value != ''}
+
+
+def parse_date(value):
+    if not value:
+        return timezone.now()
+    date = parse_datetime(value)
+    if date is None:
+        raise ValueError(f'Неверная дата: {value}')
+    if timezone.is_naive(date):
+        date = timezone.make_aware(date, timezone.utc)
+    return date
+
+
+class Command(BaseCommand):
+    help = ('Потоково загружает группы, посты, комментарии и подписки '
+            'из JSONL или CSV.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='+')
+        parser.add_argument('--format', choices=('jsonl', 'csv'))
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--create-users', action='store_true',
+            help='Создавать отсутствующих пользователей без пароля.'
+        )
+        parser.add_argument(
+            '--full-refresh', action='store_true',
+            help='После загрузки пересчитать счётчики, ленты и поисковый '
+                 'индекс всего сайта, а не только затронутых записей.'
+        )
+
+    def handle(self, *args, **options):
+        self.create_users = options['create_users']
+        self.users = dict(User.objects.values_list('username', 'pk'))
+        self.groups = dict(Group.objects.values_list('slug', 'pk'))
+        self.author_ids, self.group_ids, self.follower_ids = (
+            set(), set(), set()
+        )
+        self.commented_ids = set()
+        self.counts = dict.fromkeys(RECORD_TYPES, 0)
+        self.skipped = 0
+        self.started = time.monotonic()
+        for path in options['paths']:
+            file_format = options['format'] or (
+                'csv' if path.endswith('.csv') else 'jsonl'
+            )
+            reader = read_csv if file_format == 'csv' else read_jsonl
+            with open(path, encoding='utf-8', newline='') as stream:
+                records = reader(stream)
+                while True:
+                    batch = list(islice(records, options['batch_size']))
+                    if not batch:
+                        break
+                    self.import_batch(batch)
+                    self.report()
+        self.stdout.write('Пересчёт счётчиков, лент и поискового индекса')
+        refresh_denormalized(
+            self.author_ids, self.group_ids, self.follower_ids,
+            self.commented_ids, full=options['full_refresh'],
+            stdout=self.stdout,
+        )
+        self.report(final=True)
+
+    def report(self, final=False):
+        total = sum(self.counts.values())
+        elapsed = time.monotonic() - self.started
+        rate = total / elapsed if elapsed else 0
+        counts = ', '.join(
+            f'{name}: {count}' for name, count in self.counts.items()
+        )
+        prefix = 'Готово' if final else 'Загружено'
+        self.stdout.write(
+            f'{prefix}: {total} ({counts}), пропущено: {self.skipped}, '
+            f'{rate:.0f} записей/с'
+        )
+
+    def user_id(self, username):
+        if username in self.users:
+            return self.users[username]
+        if not self.create_users:
+            raise KeyError(f'Нет пользователя {username}')
+        user = User.objects.create(
+            username=username, password=make_password(None)
+        )
+        self.users[username] = user.pk
+        return user.pk
+
+    def group_id(self, slug):
+        if not slug:
+            return None
+        if slug not in self.groups:
+            raise KeyError(f'Нет группы {slug}')
+        return self.groups[slug]
+
+    def image_name(self, record):
+        name = record.get('image', '')
+        data = record.get('image_data')
+        if not data or default_storage.exists(name):
+            return name
+        return default_storage.save(
+            name, ContentFile(base64.b64decode(data))
+        )
+
+    def build(self, record):
+        kind = record.get('type')
+        if kind == 'group':
+            return Group(
+                slug=record['slug'],
+                title=record.get('title', record['slug']),
+                description=record.get('description', ''),
+            )
+        if kind == 'post':
+            post = Post(
+                id=record.get('id'),
+                author_id=self.user_id(record['author']),
+                group_id=self.group_id(record.get('group')),
+                text=record['text'],
+                pub_date=parse_date(record.get('pub_date')),
+                image=self.image_name(record),
+            )
+            self.author_ids.add(post.author_id)
+            if post.group_id:
+                self.group_ids.add(post.group_id)
+            return post
+        if kind == 'comment':
+            comment = Comment(
+                id=record.get('id'),
+                post_id=int(record['post']),
+                author_id=self.user_id(record['author']),
+                text=record['text'],
+                created=parse_date(record.get('created')),
+            )
+            self.commented_ids.add(comment.post_id)
+            return comment
+        if kind == 'follow':
+            follow = Follow(
+                user_id=self.user_id(record['user']),
+                author_id=self.user_id(record['author']),
+            )
+            self.follower_ids.add(follow.user_id)
+            # У автора изменилось число подписчиков.
+            self.author_ids.add(follow.author_id)
+            return follow
+        raise ValueError(f'Неизвестный тип записи: {kind}')
+
+    def import_batch(self, records):
+        objects = {kind: [] for kind in RECORD_TYPES}
+        with transaction.atomic(), explicit_dates():
+            for record in records:
+                kind = record.get('type')
+                if kind != 'group' and objects['group']:
+                    # Посты пачки могут ссылаться на только что прочитанные
+                    # группы, поэтому группы сохраняются раньше.
+                    self.save_groups(objects['group'])
+                    objects['group'] = []
+                try:
+                    objects[kind].append(self.build(record))
+                except (KeyError, ValueError, TypeError) as error:
+                    self.skipped += 1
+                    self.stderr.write(f'Пропуск записи {record}: {error}')
+            self.save_groups(objects['group'])
+            for kind, model in (('post', Post), ('comment', Comment),
+                                ('follow', Follow)):
+                sharding.bulk_create(
+                    model, objects[kind], ignore_conflicts=(kind == 'follow')
+                )
+                self.counts[kind] += len(objects[kind])
+
+    def save_groups(self, groups):
+        if not groups:
+            return
+        Group.objects.bulk_create(groups, ignore_conflicts=True)
+        self.groups.update(Group.objects.filter(
+            slug__in=[group.slug for group in groups]
+        ).values_list('slug', 'pk'))
+        self.group_ids.update(self.groups[group.slug] for group in groups)
+        self.counts['group'] += len(groups)
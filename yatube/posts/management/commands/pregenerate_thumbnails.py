@@ -0,0 +1,78 @@
+import logging
+import time
+from multiprocessing import Pool
+
+import django
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.utils import timezone
+
+from posts import images, sharding
+from posts.models import Post
+
+logger = logging.getLogger(__name__)
+
+
+def _init_worker():
+    django.setup()
+    connections.close_all()
+
+
+def _generate(name):
+    try:
+        details = images.read_details(name)
+    except Exception:
+        logger.exception('Не удалось прочитать %s', name)
+        return name, None
+    images.generate(name, details[0])
+    return name, details
+
+
+def _save_details(name, details):
+    if details is None:
+        return
+    width, height, placeholder = details
+    # Новый updated_at сбрасывает закэшированные карточки постов.
+    for posts in sharding.each(
+        Post.objects.filter(image=name, image_width__isnull=True)
+    ):
+        posts.update(
+            image_width=width, image_height=height,
+            image_placeholder=placeholder, updated_at=timezone.now(),
+        )
+
+
+class Command(BaseCommand):
+    help = (
+        'Кладёт в кэш resize копии для srcset всех картинок постов '
+        'и заполняет их размеры и заглушки.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=None)
+        parser.add_argument('--chunk-size', type=int, default=20)
+
+    def handle(self, *args, **options):
+        names = set()
+        for posts in sharding.each(Post.objects.exclude(image='')):
+            names.update(posts.order_by().values_list(
+                'image', flat=True
+            ).distinct())
+        started = time.monotonic()
+        done = 0
+        if options['processes'] == 1:
+            for name in names:
+                _save_details(*_generate(name))
+                done += 1
+        else:
+            connections.close_all()
+            with Pool(options['processes'], initializer=_init_worker) as pool:
+                for result in pool.imap_unordered(
+                    _generate, sorted(names), options['chunk_size']
+                ):
+                    _save_details(*result)
+                    done += 1
+        self.stdout.write(
+            f'Обработано картинок: {done} '
+            f'за {time.monotonic() - started:.1f} с'
+        )
@@ -0,0 +1,94 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+from posts import sharding
+from posts.bulk import explicit_dates, refresh_denormalized
+from posts.models import Comment, Post
+
+
+class Command(BaseCommand):
+    help = (
+        'Переносит посты с комментариями на шарды их авторов '
+        'после изменения POST_SHARDS.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--include-default', action='store_true',
+            help='Переносить и посты, оставшиеся в основной базе.',
+        )
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--dry-run', action='store_true')
+
+    def handle(self, *args, **options):
+        if not sharding.enabled():
+            raise CommandError('POST_SHARDS пуст: переносить некуда.')
+        sources = sharding.shards()
+        if options['include_default']:
+            sources.insert(0, DEFAULT_DB_ALIAS)
+        moved = {}
+        groups = set()
+        for source in sources:
+            authors = Post.objects.using(source).order_by().values_list(
+                'author', flat=True
+            ).distinct()
+            for author_id in list(authors):
+                target = sharding.shard_for(author_id)
+                if target == source:
+                    continue
+                if options['dry_run']:
+                    count = Post.objects.using(source).filter(
+                        author=author_id
+                    ).count()
+                else:
+                    count = self.move(
+                        author_id, source, target, options['batch_size'],
+                        groups,
+                    )
+                moved[author_id] = moved.get(author_id, 0) + count
+                self.stdout.write(
+                    f'Автор {author_id}: {source} -> {target}, '
+                    f'постов: {count}'
+                )
+        if moved and not options['dry_run']:
+            refresh_denormalized(
+                author_ids=moved, group_ids=groups, stdout=self.stdout
+            )
+        self.stdout.write(
+            f'Авторов: {len(moved)}, постов: {sum(moved.values())}'
+        )
+
+    def move(self, author_id, source, target, batch_size, groups):
+        posts = Post.objects.using(source).filter(
+            author=author_id
+        ).order_by('pk')
+        total = 0
+        while True:
+            batch = list(posts[:batch_size])
+            if not batch:
+                return total
+            ids = [post.pk for post in batch]
+            comments = list(
+                Comment.objects.using(source).filter(post__in=ids)
+            )
+            groups.update(
+                post.group_id for post in batch if post.group_id
+            )
+            sharding.ensure_references(
+                target,
+                {author_id, *(comment.author_id for comment in comments)},
+                {post.group_id for post in batch},
+            )
+            with explicit_dates(), transaction.atomic(using=target):
+                Post.objects.using(target).bulk_create(
+                    batch, ignore_conflicts=True
+                )
+                Comment.objects.using(target).bulk_create(
+                    comments, ignore_conflicts=True
+                )
+            # Копия уже на месте. Каскад удаляет комментарии и записи
+            # лент, а счётчики после сигналов удаления пересчитает
+            # refresh_denormalized.
+            with transaction.atomic(using=source):
+                Post.objects.using(source).filter(pk__in=ids).delete()
+            total += len(batch)
@@ -0,0 +1,57 @@
+from django.core.management.base import BaseCommand
+
+from posts.models import AuthorStats, User
+from posts.stats import COUNTERS, shard_post_counts, with_exact_counts
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает счётчики постов и подписок авторов.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--users', nargs='*', type=int,
+            help='Пересчитать только пользователей с этими id.',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        users = User.objects.order_by('pk')
+        if options['users'] is not None:
+            users = users.filter(pk__in=options['users'])
+        users = with_exact_counts(users)
+        last_pk = 0
+        fixed = created = 0
+        while True:
+            batch = list(users.filter(pk__gt=last_pk)[:batch_size])
+            if not batch:
+                break
+            last_pk = batch[-1].pk
+            stored = {
+                stats.author_id: stats
+                for stats in AuthorStats.objects.filter(author__in=batch)
+            }
+            sharded = shard_post_counts([user.pk for user in batch])
+            to_update, to_create = [], []
+            for user in batch:
+                counts = dict(zip(COUNTERS, (
+                    user.posts_total if sharded is None
+                    else sharded[user.pk],
+                    user.followers_total,
+                    user.following_total,
+                )))
+                stats = stored.get(user.pk)
+                if stats is None:
+                    to_create.append(AuthorStats(author=user, **counts))
+                elif any(getattr(stats, field) != value
+                         for field, value in counts.items()):
+                    for field, value in counts.items():
+                        setattr(stats, field, value)
+                    to_update.append(stats)
+            AuthorStats.objects.bulk_create(to_create, ignore_conflicts=True)
+            AuthorStats.objects.bulk_update(to_update, COUNTERS)
+            fixed += len(to_update)
+            created += len(to_create)
+        self.stdout.write(
+            f'Исправлено записей: {fixed}, создано: {created}'
+        )
@@ -0,0 +1,110 @@
+import random
+import time
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from faker import Faker
+
+from posts import sharding
+from posts.bulk import explicit_dates, refresh_denormalized
+from posts.models import Comment, Follow, Group, Post, User
+
+# Даты постов и комментариев равномерно распределены по этому периоду.
+SEED_PERIOD = timedelta(days=365 * 3)
+
+
+class Command(BaseCommand):
+    help = 'Заполняет базу синтетическими данными для нагрузочных замеров.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--groups', type=int, default=50)
+        parser.add_argument('--posts', type=int, default=100000)
+        parser.add_argument('--comments', type=int, default=100000)
+        parser.add_argument('--follows', type=int, default=10000)
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--password', default='password',
+            help='Общий пароль для созданных пользователей.'
+        )
+
+    def handle(self, *args, **options):
+        self.fake = Faker('ru_RU')
+        self.fake.seed_instance(options['seed'])
+        self.random = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        self.now = timezone.now()
+        started = time.monotonic()
+        password = make_password(options['password'])
+        self.create(User, options['users'], lambda i: User(
+            username=f'{self.fake.user_name()}_{i}',
+            first_name=self.fake.first_name(),
+            last_name=self.fake.last_name(),
+            password=password,
+        ))
+        self.create(Group, options['groups'], lambda i: Group(
+            title=self.fake.sentence(nb_words=3)[:200],
+            slug=f'group-{i}',
+            description=self.fake.paragraph(),
+        ))
+        user_ids = list(User.objects.values_list('pk', flat=True))
+        group_ids = list(Group.objects.values_list('pk', flat=True))
+        if not user_ids:
+            self.stderr.write('Нет пользователей для постов.')
+            return
+        self.create(Post, options['posts'], lambda i: Post(
+            author_id=self.random.choice(user_ids),
+            group_id=(
+                self.random.choice(group_ids)
+                if group_ids and self.random.random() < 0.5 else None
+            ),
+            text=self.fake.paragraph(nb_sentences=5),
+            pub_date=self.date(),
+        ))
+        post_ids = [
+            pk for posts in sharding.each(Post.objects.values_list(
+                'pk', flat=True
+            )) for pk in posts
+        ]
+        if post_ids:
+            self.create(Comment, options['comments'], lambda i: Comment(
+                post_id=self.random.choice(post_ids),
+                author_id=self.random.choice(user_ids),
+                text=self.fake.sentence(),
+                created=self.date(),
+            ))
+        self.create(Follow, options['follows'], self.follow(user_ids))
+        self.stdout.write('Пересчёт счётчиков, лент и поискового индекса')
+        refresh_denormalized(
+            user_ids, group_ids, user_ids, post_ids, stdout=self.stdout
+        )
+        self.stdout.write(
+            f'Готово за {time.monotonic() - started:.1f} с'
+        )
+
+    def date(self):
+        return self.now - SEED_PERIOD * self.random.random()
+
+    def follow(self, user_ids):
+        def build(i):
+            user, author = self.random.sample(user_ids, 2)
+            return Follow(user_id=user, author_id=author)
+        return build if len(user_ids) > 1 else None
+
+    def create(self, model, count, build):
+        if not count or build is None:
+            return
+        name = model._meta.verbose_name_plural
+        started = time.monotonic()
+        for offset in range(0, count, self.batch_size):
+            size = min(self.batch_size, count - offset)
+            objects = [build(offset + i) for i in range(size)]
+            with transaction.atomic(), explicit_dates():
+                sharding.bulk_create(model, objects, ignore_conflicts=True)
+            done = offset + size
+            rate = done / (time.monotonic() - started)
+            self.stdout.write(f'{name}: {done}/{count}, {rate:.0f} в секунду')
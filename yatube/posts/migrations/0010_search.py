@@ -0,0 +1,40 @@
+from django.db import migrations
+
+
+def create_search_tables(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(
+        'CREATE VIRTUAL TABLE posts_search_post USING fts5('
+        "text, tokenize = 'unicode61')"
+    )
+    schema_editor.execute(
+        'CREATE VIRTUAL TABLE posts_search_comment USING fts5('
+        "text, post_id UNINDEXED, tokenize = 'unicode61')"
+    )
+    schema_editor.execute(
+        'INSERT INTO posts_search_post (rowid, text) '
+        'SELECT id, text FROM posts_post'
+    )
+    schema_editor.execute(
+        'INSERT INTO posts_search_comment (rowid, text, post_id) '
+        'SELECT id, text, post_id FROM posts_comment'
+    )
+
+
+def drop_search_tables(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute('DROP TABLE posts_search_post')
+    schema_editor.execute('DROP TABLE posts_search_comment')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0009_auto_20261017_0711'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_tables, drop_search_tables),
+    ]
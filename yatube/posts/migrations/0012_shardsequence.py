@@ -0,0 +1,24 @@
+# Generated by Django 2.2.16 on 2026-10-17 07:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0011_post_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShardSequence',
+            fields=[
+                ('name', models.CharField(max_length=100, primary_key=True, serialize=False, verbose_name='Модель')),
+                ('last_value', models.BigIntegerField(default=0, verbose_name='Последний id')),
+            ],
+            options={
+                'verbose_name': 'Счётчик id',
+                'verbose_name_plural': 'Счётчики id',
+            },
+        ),
+    ]
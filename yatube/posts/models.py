@@ -4,6 +4,30 @@ from django.db import models
 User = get_user_model()
 
 
+class ShardedQuerySet(models.QuerySet):
+    def create(self, **kwargs):
+        # Без явного using базу выбирает роутер по самой строке: так пост
+        # попадает на шард автора, а комментарий — на шард поста.
+        if self._db is not None:
+            return super().create(**kwargs)
+        obj = self.model(**kwargs)
+        self._for_write = True
+        obj.save(force_insert=True)
+        return obj
+
+
+class PostQuerySet(ShardedQuerySet):
+    def for_feed(self):
+        return self.select_related('author', 'group')
+
+    def for_author(self, author_id):
+        """Посты автора с его шарда, если посты разнесены по базам."""
+        from .sharding import shard_for
+        posts = self.filter(author=author_id)
+        alias = shard_for(author_id)
+        return posts if alias is None else posts.using(alias)
+
+
 class Post(models.Model):
     text = models.TextField(
         verbose_name='Текст',
@@ -13,6 +37,10 @@ class Post(models.Model):
         auto_now_add=True,
         verbose_name='Дата публикации'
     )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Дата изменения'
+    )
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -34,6 +62,19 @@ class Post(models.Model):
         upload_to='posts/',
         blank=True
     )
+    # Заполняются при сохранении поста (posts.signals), чтобы шаблонам
+    # не приходилось открывать файл картинки.
+    image_width = models.PositiveIntegerField(
+        'Ширина картинки', null=True, blank=True, editable=False
+    )
+    image_height = models.PositiveIntegerField(
+        'Высота картинки', null=True, blank=True, editable=False
+    )
+    image_placeholder = models.TextField(
+        'Заглушка картинки', blank=True, editable=False
+    )
+
+    objects = PostQuerySet.as_manager()
 
     def __str__(self):
         post_symbols = 15
@@ -41,6 +82,11 @@ class Post(models.Model):
 
     class Meta:
         ordering = ['-pub_date', ]
+        indexes = [
+            models.Index(fields=['-pub_date']),
+            models.Index(fields=['author', '-pub_date']),
+            models.Index(fields=['group', '-pub_date']),
+        ]
         verbose_name = 'Пост'
         verbose_name_plural = 'Посты'
 
@@ -85,6 +131,8 @@ class Comment(models.Model):
         auto_now_add=True,
     )
 
+    objects = ShardedQuerySet.as_manager()
+
 
 class Follow(models.Model):
     user = models.ForeignKey(
@@ -99,3 +147,98 @@ class Follow(models.Model):
         on_delete=models.CASCADE,
         verbose_name='Автор'
     )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'author'],
+                name='unique_follow',
+            ),
+        ]
+
+
+class FeedEntry(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+        verbose_name='Подписчик',
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+        verbose_name='Пост',
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Автор',
+    )
+    pub_date = models.DateTimeField(
+        verbose_name='Дата публикации'
+    )
+
+    class Meta:
+        ordering = ['-pub_date', ]
+        indexes = [
+            models.Index(fields=['user', '-pub_date']),
+            models.Index(fields=['user', 'author']),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'post'],
+                name='unique_feed_entry',
+            ),
+        ]
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи ленты'
+
+
+class AuthorStats(models.Model):
+    author = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        related_name='stats',
+        verbose_name='Автор',
+    )
+    posts_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Постов',
+    )
+    followers_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Подписчиков',
+    )
+    following_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Подписок',
+    )
+
+    class Meta:
+        verbose_name = 'Статистика автора'
+        verbose_name_plural = 'Статистика авторов'
+
+    def __str__(self):
+        return str(self.author)
+
+
+class ShardSequence(models.Model):
+    """Счётчик id постов и комментариев, общий для всех шардов."""
+    name = models.CharField(
+        max_length=100,
+        primary_key=True,
+        verbose_name='Модель',
+    )
+    last_value = models.BigIntegerField(
+        default=0,
+        verbose_name='Последний id',
+    )
+
+    class Meta:
+        verbose_name = 'Счётчик id'
+        verbose_name_plural = 'Счётчики id'
+
+    def __str__(self):
+        return self.name
@@ -0,0 +1,203 @@
+"""Копии картинок по запросу: MEDIA_URL/resize/<геометрия>/<путь>.
+
+Геометрия — «ШxВ.формат», например 960x339.webp: картинка вписывается
+в размер с обрезкой по центру. Разрешены только размеры карточки поста
+для ширин IMAGE_WIDTHS, чтобы произвольные адреса не заполняли диск.
+Копии делаются только для картинок существующих постов (путь в posts/):
+ни готовые копии, ни другие файлы MEDIA_ROOT повторно не режутся.
+Готовая копия лежит в MEDIA_ROOT/resize по тому же пути, что и в адресе,
+поэтому веб-сервер может отдавать её сам, а Django только создаёт
+недостающие. Кэш ограничен IMAGE_RESIZE_MAX_SIZE байт: при переполнении
+удаляются копии, которые дольше всех не читали (время чтения — mtime).
+"""
+import os
+import re
+import tempfile
+import threading
+import time
+from io import BytesIO
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.storage import default_storage
+from django.urls import reverse
+from django.utils._os import safe_join
+from PIL import Image, ImageOps
+
+from core import metrics
+
+from . import sharding
+from .models import Post
+
+RESIZE_DIR = 'resize'
+UPLOAD_DIR = Post._meta.get_field('image').upload_to
+# Пропорции картинки в карточке поста.
+CARD_RATIO = 339 / 960
+FORMATS = {'webp': 'WEBP', 'jpeg': 'JPEG'}
+CONTENT_TYPES = {'webp': 'image/webp', 'jpeg': 'image/jpeg'}
+GEOMETRY_RE = re.compile(
+    r'^(?P<width>\d+)x(?P<height>\d+)\.(?P<extension>webp|jpeg)$'
+)
+# mtime копии обновляется не чаще раза в TOUCH_INTERVAL секунд.
+TOUCH_INTERVAL = 60 * 60
+
+_lock = threading.Lock()
+_writes = 0
+
+
+def save_options(image_format):
+    if image_format in ('JPEG', 'WEBP'):
+        return {'quality': settings.IMAGE_QUALITY}
+    return {}
+
+
+def flatten(image):
+    if image.mode in ('RGBA', 'LA', 'PA') or 'transparency' in image.info:
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, 'white')
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    return image.convert('RGB')
+
+
+def card_size(width):
+    return width, round(width * CARD_RATIO)
+
+
+def geometry(width, height, extension):
+    return f'{width}x{height}.{extension}'
+
+
+def parse_geometry(value):
+    match = GEOMETRY_RE.match(value)
+    if match is None:
+        return None
+    size = int(match['width']), int(match['height'])
+    if size not in {card_size(width) for width in settings.IMAGE_WIDTHS}:
+        return None
+    return (*size, match['extension'])
+
+
+def cache_root():
+    return os.path.join(settings.MEDIA_ROOT, RESIZE_DIR)
+
+
+def valid_name(name):
+    return name.startswith(UPLOAD_DIR) and os.path.normpath(name) == name
+
+
+def is_post_image(name):
+    return valid_name(name) and sharding.first(
+        Post.objects.filter(image=name).values('pk')
+    ) is not None
+
+
+def cache_path(geometry, name):
+    if not valid_name(name):
+        raise SuspiciousFileOperation(f'Не картинка поста: {name}')
+    return safe_join(cache_root(), geometry, name)
+
+
+def url(geometry, name):
+    return reverse('image_resize', args=[geometry, name])
+
+
+def render(name, width, height, extension):
+    with default_storage.open(name) as source, Image.open(source) as image:
+        image = flatten(ImageOps.exif_transpose(image))
+    image = ImageOps.fit(image, (width, height), Image.LANCZOS)
+    buffer = BytesIO()
+    image.save(
+        buffer, FORMATS[extension], **save_options(FORMATS[extension])
+    )
+    return buffer.getvalue()
+
+
+def _create(path, geometry, name):
+    global _writes
+    started = time.perf_counter()
+    data = render(name, *parse_geometry(geometry))
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    # Копия появляется целиком: читатели не видят недописанный файл.
+    descriptor, temporary = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+    with os.fdopen(descriptor, 'wb') as stream:
+        stream.write(data)
+    os.replace(temporary, path)
+    metrics.observe(
+        'yatube_image_resize_seconds', time.perf_counter() - started,
+        geometry=geometry,
+    )
+    with _lock:
+        _writes += 1
+        due = _writes % settings.IMAGE_RESIZE_CULL_EVERY == 0
+    if due:
+        cull()
+
+
+def _touch(path):
+    try:
+        if os.stat(path).st_mtime < time.time() - TOUCH_INTERVAL:
+            os.utime(path)
+    except FileNotFoundError:
+        pass
+
+
+def ensure(geometry, name):
+    """Путь к копии; создаёт её, если копии ещё нет."""
+    path = cache_path(geometry, name)
+    if os.path.exists(path):
+        _touch(path)
+    else:
+        _create(path, geometry, name)
+    return path
+
+
+def open_resized(geometry, name):
+    """Открытый файл копии. OSError, если это не картинка поста или её
+    не удалось прочитать."""
+    if not valid_name(name):
+        raise FileNotFoundError(name)
+    path = cache_path(geometry, name)
+    try:
+        stream = open(path, 'rb')
+    except FileNotFoundError:
+        if not is_post_image(name):
+            raise
+        metrics.inc('yatube_image_resize_total', result='miss')
+        _create(path, geometry, name)
+        return open(path, 'rb')
+    metrics.inc('yatube_image_resize_total', result='hit')
+    _touch(path)
+    return stream
+
+
+def entries():
+    for directory, _, files in os.walk(cache_root()):
+        for file_name in files:
+            path = os.path.join(directory, file_name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            yield stat.st_mtime, stat.st_size, path
+
+
+def cull(max_size=None):
+    """Удаляет давно не читавшиеся копии, пока кэш больше max_size байт.
+    Возвращает число удалённых файлов и освобождённых байт."""
+    if max_size is None:
+        max_size = settings.IMAGE_RESIZE_MAX_SIZE
+    files = sorted(entries())
+    excess = sum(size for _, size, _ in files) - max_size
+    removed = freed = 0
+    for _, size, path in files:
+        if freed >= excess:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            continue
+        removed += 1
+        freed += size
+    return removed, freed
@@ -0,0 +1,163 @@
+import re
+
+from django.db import connection
+from django.db.models.expressions import RawSQL
+
+from . import sharding
+
+POST_TABLE = 'posts_search_post'
+COMMENT_TABLE = 'posts_search_comment'
+# Совпадение в комментарии весит меньше, чем совпадение в тексте поста.
+COMMENT_WEIGHT = 0.5
+
+
+def enabled():
+    # Индекс строится по основной базе, с шардами поиск выключен.
+    return connection.vendor == 'sqlite' and not sharding.enabled()
+
+
+def match_expression(query):
+    terms = re.findall(r'\w+', query)
+    return ' '.join(f'"{term}"*' for term in terms)
+
+
+def _replace(table, rowid, columns):
+    if not enabled():
+        return
+    names = ', '.join(columns)
+    placeholders = ', '.join(['%s'] * len(columns))
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {table} WHERE rowid = %s', [rowid])
+        cursor.execute(
+            f'INSERT INTO {table} (rowid, {names}) '
+            f'VALUES (%s, {placeholders})',
+            [rowid, *columns.values()],
+        )
+
+
+def _delete(table, rowid):
+    if not enabled():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {table} WHERE rowid = %s', [rowid])
+
+
+def index_post(post):
+    _replace(POST_TABLE, post.pk, {'text': post.text})
+
+
+def unindex_post(post_id):
+    _delete(POST_TABLE, post_id)
+
+
+def index_comment(comment):
+    _replace(COMMENT_TABLE, comment.pk, {
+        'text': comment.text,
+        'post_id': comment.post_id,
+    })
+
+
+def unindex_comment(comment_id):
+    _delete(COMMENT_TABLE, comment_id)
+
+
+def matching_posts(query):
+    """Подзапрос с id постов, чей текст подходит под запрос, для
+    pk__in: список id не собирается в памяти и не упирается в лимит
+    параметров SQLite. None, если в запросе нет слов."""
+    expression = match_expression(query)
+    if not expression or not enabled():
+        return None
+    return RawSQL(
+        f'SELECT rowid FROM {POST_TABLE} WHERE {POST_TABLE} MATCH %s',
+        [expression],
+    )
+
+
+def search_post_ids(query, limit=None, comments=True):
+    """id постов, подходящих под запрос, от лучшего совпадения.
+
+    rank в FTS5 по умолчанию равен bm25().
+    """
+    expression = match_expression(query)
+    if not expression or not enabled():
+        return []
+    sql = (
+        'SELECT rowid AS post_id, rank AS score '
+        f'FROM {POST_TABLE} WHERE {POST_TABLE} MATCH %s'
+    )
+    params = [expression]
+    if comments:
+        sql += (
+            f' UNION ALL SELECT post_id, '
+            f'rank * {COMMENT_WEIGHT} '
+            f'FROM {COMMENT_TABLE} WHERE {COMMENT_TABLE} MATCH %s'
+        )
+        params.append(expression)
+    sql = (
+        f'SELECT post_id FROM ({sql}) '
+        f'GROUP BY post_id ORDER BY MIN(score), post_id DESC'
+    )
+    if limit is not None:
+        sql += ' LIMIT %s'
+        params.append(limit)
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return [row[0] for row in cursor.fetchall()]
+
+
+def _chunks(ids, size=500):
+    ids = sorted(set(ids))
+    for start in range(0, len(ids), size):
+        yield ids[start:start + size]
+
+
+def reindex(author_ids=(), post_ids=()):
+    """Переиндексирует посты авторов author_ids и комментарии к постам
+    post_ids после массовой загрузки, не трогая остальной индекс."""
+    if not enabled():
+        return
+    with connection.cursor() as cursor:
+        for chunk in _chunks(author_ids):
+            placeholders = ', '.join(['%s'] * len(chunk))
+            cursor.execute(
+                f'DELETE FROM {POST_TABLE} WHERE rowid IN ('
+                f'SELECT id FROM posts_post '
+                f'WHERE author_id IN ({placeholders}))',
+                chunk,
+            )
+            cursor.execute(
+                f'INSERT INTO {POST_TABLE} (rowid, text) '
+                f'SELECT id, text FROM posts_post '
+                f'WHERE author_id IN ({placeholders})',
+                chunk,
+            )
+        for chunk in _chunks(post_ids):
+            placeholders = ', '.join(['%s'] * len(chunk))
+            cursor.execute(
+                f'DELETE FROM {COMMENT_TABLE} '
+                f'WHERE post_id IN ({placeholders})',
+                chunk,
+            )
+            cursor.execute(
+                f'INSERT INTO {COMMENT_TABLE} (rowid, text, post_id) '
+                f'SELECT id, text, post_id FROM posts_comment '
+                f'WHERE post_id IN ({placeholders})',
+                chunk,
+            )
+
+
+def rebuild_index():
+    if not enabled():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {POST_TABLE}')
+        cursor.execute(
+            f'INSERT INTO {POST_TABLE} (rowid, text) '
+            f'SELECT id, text FROM posts_post'
+        )
+        cursor.execute(f'DELETE FROM {COMMENT_TABLE}')
+        cursor.execute(
+            f'INSERT INTO {COMMENT_TABLE} (rowid, text, post_id) '
+            f'SELECT id, text, post_id FROM posts_comment'
+        )
@@ -0,0 +1,335 @@
+"""Посты и комментарии, разнесённые по базам по автору поста.
+
+Включается списком псевдонимов баз в POST_SHARDS. Пост лежит на шарде
+своего автора, комментарий — на шарде поста. id выдаёт общий счётчик
+ShardSequence в основной базе. Пользователи и группы копируются на
+шарды, чтобы работали внешние ключи и select_related.
+"""
+import heapq
+import zlib
+from functools import reduce
+from itertools import islice
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, IntegrityError, transaction
+from django.db.models import F, Max
+from django.db.models.constants import LOOKUP_SEP
+from django.http import Http404
+
+from .models import Comment, Group, Post, ShardSequence, User
+
+SHARDED_MODELS = (Post, Comment)
+# Поля пользователя, которые копируются на шарды; пароль не копируется.
+USER_FIELDS = ('username', 'first_name', 'last_name')
+
+
+def shards():
+    return list(getattr(settings, 'POST_SHARDS', []))
+
+
+def enabled():
+    return bool(shards())
+
+
+def shard_for(author_id):
+    aliases = shards()
+    if not aliases:
+        return None
+    return aliases[zlib.crc32(str(author_id).encode()) % len(aliases)]
+
+
+def each(queryset):
+    """Та же выборка на каждом шарде или сама выборка без шардов."""
+    if not enabled():
+        return [queryset]
+    return [queryset.using(alias) for alias in shards()]
+
+
+def scatter(queryset):
+    return ScatterGather(each(queryset)) if enabled() else queryset
+
+
+def scatter_authors(queryset, author_ids):
+    """Посты авторов со своих шардов: каждый шард спрашивают только
+    о его авторах."""
+    by_shard = {}
+    for author_id in author_ids:
+        by_shard.setdefault(shard_for(author_id), []).append(author_id)
+    return ScatterGather([
+        queryset.using(alias).filter(author__in=ids)
+        for alias, ids in by_shard.items()
+    ])
+
+
+def first(queryset):
+    for shard_queryset in each(queryset):
+        found = shard_queryset.first()
+        if found is not None:
+            return found
+    return None
+
+
+def get_post_or_404(queryset, post_id):
+    post = first(queryset.filter(pk=post_id))
+    if post is None:
+        raise Http404('Пост не найден')
+    return post
+
+
+class ScatterGather:
+    """Выборка с нескольких шардов, слитая в порядке её order_by.
+
+    Без явного порядка берётся Meta.ordering модели, а если нет и его —
+    (-pub_date, -pk). Для однозначного слияния порядок дополняется pk в
+    ту же сторону. Срез [a:b] читает с каждого шарда первые b строк и
+    сливает их k-way merge, поэтому поддерживает Paginator.
+    """
+    ordered = True
+    DEFAULT_ORDERING = ('-pub_date', '-pk')
+
+    def __init__(self, querysets):
+        ordering = self._ordering(querysets)
+        self.reverse = ordering[0].startswith('-')
+        if not {'pk', '-pk'} & set(ordering):
+            ordering.append('-pk' if self.reverse else 'pk')
+        self.fields = [field.lstrip('-') for field in ordering]
+        self.querysets = [
+            queryset.order_by(*ordering) for queryset in querysets
+        ]
+
+    def _ordering(self, querysets):
+        if not querysets:
+            return list(self.DEFAULT_ORDERING)
+        query = querysets[0].query
+        ordering = list(query.order_by or (
+            query.default_ordering and query.get_meta().ordering
+        ) or self.DEFAULT_ORDERING)
+        if not all(isinstance(field, str) for field in ordering):
+            raise TypeError('Слияние шардов поддерживает только порядок '
+                            'по именам полей.')
+        if len({field.startswith('-') for field in ordering}) > 1:
+            raise ValueError('Слияние шардов не поддерживает порядок '
+                             'в разные стороны.')
+        return ordering
+
+    def _key(self, row):
+        return tuple(
+            reduce(getattr, field.split(LOOKUP_SEP), row)
+            for field in self.fields
+        )
+
+    def _merge(self, rows):
+        return heapq.merge(*rows, key=self._key, reverse=self.reverse)
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+
+        def method(*args, **kwargs):
+            return ScatterGather([
+                getattr(queryset, name)(*args, **kwargs)
+                for queryset in self.querysets
+            ])
+        return method
+
+    def count(self):
+        return sum(queryset.count() for queryset in self.querysets)
+
+    def __len__(self):
+        return self.count()
+
+    def __iter__(self):
+        return self._merge(
+            queryset.iterator() for queryset in self.querysets
+        )
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        start, stop = index.start or 0, index.stop
+        heads = [
+            queryset if stop is None else queryset[:stop]
+            for queryset in self.querysets
+        ]
+        return list(islice(self._merge(heads), start, stop))
+
+
+def last_pk(model):
+    return max(
+        model.objects.using(alias).aggregate(last=Max('pk'))['last'] or 0
+        for alias in [DEFAULT_DB_ALIAS, *shards()]
+    )
+
+
+def allocate_id(model, count=1):
+    """Резервирует count id подряд и возвращает первый из них."""
+    name = model._meta.label_lower
+    with transaction.atomic(using=DEFAULT_DB_ALIAS):
+        sequences = ShardSequence.objects.using(DEFAULT_DB_ALIAS)
+        if not sequences.filter(name=name).update(
+            last_value=F('last_value') + count
+        ):
+            sequences.create(name=name, last_value=last_pk(model) + count)
+        return sequences.get(name=name).last_value - count + 1
+
+
+def advance_sequences():
+    """Подтягивает счётчики id к строкам, вставленным в обход
+    allocate_id (bulk_create при загрузке и переносе)."""
+    for model in SHARDED_MODELS:
+        last = last_pk(model)
+        ShardSequence.objects.using(DEFAULT_DB_ALIAS).filter(
+            name=model._meta.label_lower, last_value__lt=last
+        ).update(last_value=last)
+
+
+def _assign_ids(model, objects):
+    """Строкам без id — id из общего счётчика. Счётчик сначала
+    подтягивается к явным id пачки, чтобы выданные с ними не совпали."""
+    explicit = [obj.pk for obj in objects if obj.pk is not None]
+    if explicit:
+        highest = max(explicit)
+        sequences = ShardSequence.objects.using(DEFAULT_DB_ALIAS)
+        sequence, _ = sequences.get_or_create(
+            name=model._meta.label_lower,
+            defaults={'last_value': max(last_pk(model), highest)},
+        )
+        sequences.filter(
+            pk=sequence.pk, last_value__lt=highest
+        ).update(last_value=highest)
+    missing = [obj for obj in objects if obj.pk is None]
+    if missing:
+        first_id = allocate_id(model, len(missing))
+        for offset, obj in enumerate(missing):
+            obj.pk = first_id + offset
+
+
+def _comment_shards(post_ids):
+    located = {}
+    for alias in shards():
+        located.update(dict.fromkeys(
+            Post.objects.using(alias).filter(
+                pk__in=post_ids
+            ).values_list('pk', flat=True),
+            alias,
+        ))
+    return located
+
+
+def bulk_create(model, objects, **kwargs):
+    """bulk_create, раскладывающий посты по шардам авторов, а
+    комментарии — по шардам постов. Роутер без экземпляра не знает
+    шарда, поэтому массовая загрузка идёт через эту функцию."""
+    objects = list(objects)
+    if model not in SHARDED_MODELS or not enabled():
+        return model.objects.bulk_create(objects, **kwargs)
+    if model is Post:
+        targets = [shard_for(post.author_id) for post in objects]
+    else:
+        located = _comment_shards({comment.post_id for comment in objects})
+        missing = {comment.post_id for comment in objects} - set(located)
+        if missing:
+            raise IntegrityError(f'Нет постов с id {sorted(missing)}')
+        targets = [located[comment.post_id] for comment in objects]
+    _assign_ids(model, objects)
+    by_shard = {}
+    for alias, obj in zip(targets, objects):
+        by_shard.setdefault(alias, []).append(obj)
+    for alias, rows in by_shard.items():
+        ensure_references(
+            alias,
+            {row.author_id for row in rows},
+            {getattr(row, 'group_id', None) for row in rows},
+        )
+        with transaction.atomic(using=alias):
+            model.objects.using(alias).bulk_create(rows, **kwargs)
+    return objects
+
+
+def ensure_references(alias, user_ids=(), group_ids=()):
+    """Копирует на шард недостающих пользователей и группы."""
+    for model, ids in ((User, user_ids), (Group, group_ids)):
+        ids = set(ids) - {None}
+        if not ids:
+            continue
+        existing = set(model.objects.using(alias).filter(
+            pk__in=ids
+        ).values_list('pk', flat=True))
+        missing = model.objects.using(DEFAULT_DB_ALIAS).filter(
+            pk__in=ids - existing
+        )
+        if model is User:
+            copies = [
+                User(pk=user.pk, password='!', **{
+                    field: getattr(user, field) for field in USER_FIELDS
+                })
+                for user in missing
+            ]
+        else:
+            copies = list(missing)
+        model.objects.using(alias).bulk_create(copies, ignore_conflicts=True)
+
+
+def sync_reference(instance):
+    fields = USER_FIELDS if isinstance(instance, User) else (
+        'title', 'slug', 'description'
+    )
+    for alias in shards():
+        type(instance).objects.using(alias).filter(pk=instance.pk).update(
+            **{field: getattr(instance, field) for field in fields}
+        )
+
+
+def delete_reference(instance):
+    # Каскад на шарде удаляет посты пользователя и обнуляет группу.
+    for alias in shards():
+        type(instance).objects.using(alias).filter(pk=instance.pk).delete()
+
+
+def prepare(instance, using):
+    """Перед сохранением на шард: общий id и копии связанных строк."""
+    if instance.pk is None:
+        instance.pk = allocate_id(type(instance))
+    if isinstance(instance, Post):
+        ensure_references(using, [instance.author_id], [instance.group_id])
+    else:
+        ensure_references(using, [instance.author_id])
+
+
+class ShardRouter:
+    def db_for_write(self, model, **hints):
+        if model not in SHARDED_MODELS or not enabled():
+            return None
+        return self._shard(hints.get('instance'))
+
+    def db_for_read(self, model, **hints):
+        if model not in SHARDED_MODELS or not enabled():
+            return None
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db in shards():
+            return instance._state.db
+        return None
+
+    def _shard(self, instance):
+        if instance is None:
+            return None
+        if instance._state.db in shards():
+            return instance._state.db
+        if isinstance(instance, Post):
+            return shard_for(instance.author_id)
+        if isinstance(instance, Comment):
+            post = instance._meta.get_field('post').get_cached_value(
+                instance, None
+            )
+            if post is not None and post._state.db in shards():
+                return post._state.db
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        if not enabled():
+            return None
+        # Строки шарда связаны с копиями пользователей и групп.
+        databases = {DEFAULT_DB_ALIAS, *shards()}
+        if {obj1._state.db, obj2._state.db} <= databases:
+            return True
+        return None
@@ -0,0 +1,188 @@
+from django.db.models.signals import (post_delete, post_save, pre_delete,
+                                      pre_save)
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import (cards, counts, feed, generations, images, search, sharding,
+               stats)
+from .models import Comment, Follow, Group, Post, User
+
+# Поля автора, которые выводит карточка поста.
+CARD_AUTHOR_FIELDS = ('first_name', 'last_name')
+
+
+def bump_post(post):
+    scopes = [
+        generations.INDEX,
+        generations.profile_scope(post.author_id),
+        generations.post_scope(post.pk),
+    ]
+    for group_id in {post.group_id, getattr(post, '_old_group_id', None)}:
+        if group_id is not None:
+            scopes.append(generations.group_scope(group_id))
+    generations.bump(*scopes)
+
+
+@receiver(pre_save, sender=Post)
+@receiver(pre_save, sender=Comment)
+def shard_row_saving(sender, instance, using, raw=False, **kwargs):
+    if not raw and using in sharding.shards():
+        sharding.prepare(instance, using)
+
+
+@receiver(pre_save, sender=Post)
+def post_changing(sender, instance, using, raw=False, **kwargs):
+    if instance.pk and not raw:
+        old = Post.objects.using(using).filter(pk=instance.pk).values(
+            'group', 'updated_at', 'image'
+        ).first() or {}
+        instance._old_group_id = old.get('group')
+        instance._old_image = old.get('image')
+        instance._old_updated_at = old.get('updated_at')
+
+
+@receiver(pre_save, sender=Post)
+def post_image_changing(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    name = instance.image.name or None
+    if name == (getattr(instance, '_old_image', None) or None) and (
+        name is None or instance.image_width is not None
+    ):
+        return
+    images.fill_details(instance)
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, raw=False, **kwargs):
+    search.index_post(instance)
+    images.schedule(instance)
+    cards.evict(instance.pk, getattr(instance, '_old_updated_at', None))
+    bump_post(instance)
+    if created and not raw:
+        stats.increment(instance.author_id, 'posts_count')
+        counts.post_added(instance.group_id)
+        feed.fan_out(instance)
+    elif not raw:
+        counts.post_moved(
+            getattr(instance, '_old_group_id', None), instance.group_id
+        )
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    search.unindex_post(instance.pk)
+    cards.evict(instance.pk, instance.updated_at)
+    bump_post(instance)
+    stats.decrement(instance.author_id, 'posts_count')
+    counts.post_removed(instance.group_id)
+
+
+@receiver(post_save, sender=Comment)
+def comment_saved(sender, instance, **kwargs):
+    search.index_comment(instance)
+    generations.bump(generations.post_scope(instance.post_id))
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    search.unindex_comment(instance.pk)
+    generations.bump(generations.post_scope(instance.post_id))
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def group_changed(sender, instance, **kwargs):
+    generations.bump(
+        generations.INDEX, generations.group_scope(instance.pk)
+    )
+
+
+@receiver(post_save, sender=Group)
+@receiver(pre_delete, sender=Group)
+def group_cards_changed(sender, instance, created=False, raw=False,
+                        **kwargs):
+    # Карточки постов ссылаются на группу: новый updated_at даёт им новый
+    # ключ в кэше.
+    if created or raw:
+        return
+    for posts in sharding.each(Post.objects.filter(group=instance)):
+        posts.update(updated_at=timezone.now())
+    if kwargs['signal'] is post_save and sharding.enabled():
+        sharding.sync_reference(instance)
+
+
+@receiver(pre_save, sender=User)
+def user_changing(sender, instance, raw=False, update_fields=None,
+                  **kwargs):
+    if raw or not instance.pk:
+        return
+    if update_fields is not None and not set(update_fields) & set(
+        CARD_AUTHOR_FIELDS
+    ):
+        return
+    instance._old_card_fields = User.objects.filter(
+        pk=instance.pk
+    ).values_list(*CARD_AUTHOR_FIELDS).first()
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, update_fields=None, **kwargs):
+    if not created and sharding.enabled() and (
+        update_fields is None or set(update_fields) & set(sharding.USER_FIELDS)
+    ):
+        sharding.sync_reference(instance)
+    old = getattr(instance, '_old_card_fields', None)
+    instance._old_card_fields = None
+    new = tuple(getattr(instance, field) for field in CARD_AUTHOR_FIELDS)
+    if old is None or old == new:
+        return
+    Post.objects.for_author(instance.pk).update(updated_at=timezone.now())
+    # Карточки автора есть и на страницах групп, где он писал.
+    group_ids = {
+        group_id
+        for posts in sharding.each(Post.objects.filter(
+            author=instance.pk, group__isnull=False
+        ))
+        for group_id in posts.order_by().values_list(
+            'group', flat=True
+        ).distinct()
+    }
+    generations.bump(
+        generations.INDEX, generations.profile_scope(instance.pk),
+        *map(generations.group_scope, group_ids),
+    )
+
+
+@receiver(post_delete, sender=User)
+@receiver(post_delete, sender=Group)
+def reference_deleted(sender, instance, **kwargs):
+    if sharding.enabled():
+        sharding.delete_reference(instance)
+
+
+def bump_follow(follow):
+    """Подписка меняет ленту подписчика и счётчики в профилях обоих."""
+    generations.bump(
+        generations.follow_scope(follow.user_id),
+        generations.profile_scope(follow.user_id),
+        generations.profile_scope(follow.author_id),
+    )
+
+
+@receiver(post_save, sender=Follow)
+def follow_saved(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        stats.increment(instance.author_id, 'followers_count')
+        stats.increment(instance.user_id, 'following_count')
+        feed.backfill(instance.user_id, instance.author_id)
+        bump_follow(instance)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    stats.decrement(instance.author_id, 'followers_count')
+    stats.decrement(instance.user_id, 'following_count')
+    feed.prune(instance.user_id, instance.author_id)
+    feed.follower_removed(instance.author_id)
+    bump_follow(instance)
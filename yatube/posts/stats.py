@@ -0,0 +1,77 @@
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from . import sharding
+from .models import AuthorStats, Follow, Post, User
+
+COUNTERS = ('posts_count', 'followers_count', 'following_count')
+
+
+def _count(queryset, field):
+    return Coalesce(Subquery(
+        queryset.filter(**{field: OuterRef('pk')}).order_by().values(
+            field
+        ).annotate(count=Count('pk')).values('count'),
+        output_field=IntegerField(),
+    ), 0)
+
+
+def with_exact_counts(users):
+    return users.annotate(
+        posts_total=_count(Post.objects.all(), 'author'),
+        followers_total=_count(Follow.objects.all(), 'author'),
+        following_total=_count(Follow.objects.all(), 'user'),
+    )
+
+
+def shard_post_counts(author_ids):
+    """Число постов авторов со всех шардов; None, если шардов нет."""
+    if not sharding.enabled():
+        return None
+    totals = dict.fromkeys(author_ids, 0)
+    for posts in sharding.each(Post.objects.filter(author__in=author_ids)):
+        for row in posts.order_by().values('author').annotate(
+            count=Count('pk')
+        ):
+            totals[row['author']] += row['count']
+    return totals
+
+
+def refresh(author_id):
+    user = with_exact_counts(User.objects.filter(pk=author_id)).get()
+    sharded = shard_post_counts([author_id])
+    counts = {
+        'posts_count': (
+            user.posts_total if sharded is None else sharded[author_id]
+        ),
+        'followers_count': user.followers_total,
+        'following_count': user.following_total,
+    }
+    try:
+        with transaction.atomic():
+            return AuthorStats.objects.create(author=user, **counts)
+    except IntegrityError:
+        AuthorStats.objects.filter(author=user).update(**counts)
+        return AuthorStats.objects.get(author=user)
+
+
+def author_stats(author):
+    try:
+        return author.stats
+    except AuthorStats.DoesNotExist:
+        return refresh(author.pk)
+
+
+def increment(author_id, field):
+    updated = AuthorStats.objects.filter(
+        author=author_id
+    ).update(**{field: F(field) + 1})
+    if not updated:
+        refresh(author_id)
+
+
+def decrement(author_id, field):
+    AuthorStats.objects.filter(
+        author=author_id, **{f'{field}__gt': 0}
+    ).update(**{field: F(field) - 1})
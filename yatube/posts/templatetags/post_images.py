@@ -0,0 +1,12 @@
+from django import template
+
+from .. import images
+
+register = template.Library()
+
+
+@register.simple_tag
+def image_sources(post):
+    if not post.image:
+        return None
+    return images.sources(post.image.name, post.image_width)
@@ -0,0 +1,236 @@
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import IntegrityError
+from django.test import TestCase, override_settings
+
+from .. import images, resize, search
+from ..models import AuthorStats, Comment, FeedEntry, Follow, Post, User
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+class AuthorStatsTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.follower = User.objects.create_user(username='follower')
+
+    def test_signals_keep_counters(self):
+        """Счётчики меняются при создании и удалении постов и подписок."""
+        post = Post.objects.create(author=self.author, text='Текст')
+        follow = Follow.objects.create(user=self.follower, author=self.author)
+        stats = AuthorStats.objects.get(author=self.author)
+        self.assertEqual(stats.posts_count, 1)
+        self.assertEqual(stats.followers_count, 1)
+        self.assertEqual(
+            AuthorStats.objects.get(author=self.follower).following_count, 1
+        )
+        post.delete()
+        follow.delete()
+        stats.refresh_from_db()
+        self.assertEqual(stats.posts_count, 0)
+        self.assertEqual(stats.followers_count, 0)
+
+    def test_reconcile_repairs_drift(self):
+        """Команда reconcile_author_stats исправляет расхождения."""
+        Post.objects.bulk_create(
+            Post(author=self.author, text=f'Пост {i}') for i in range(3)
+        )
+        AuthorStats.objects.filter(author=self.author).delete()
+        Follow.objects.create(user=self.follower, author=self.author)
+        AuthorStats.objects.filter(author=self.author).update(
+            followers_count=7
+        )
+        call_command('reconcile_author_stats', stdout=StringIO())
+        stats = AuthorStats.objects.get(author=self.author)
+        self.assertEqual(stats.posts_count, 3)
+        self.assertEqual(stats.followers_count, 1)
+
+
+class ExplainFeedsTests(TestCase):
+    def test_feed_queries_use_indexes(self):
+        """Основные запросы страниц не просматривают таблицы целиком."""
+        out = StringIO()
+        call_command('explain_feeds', stdout=out)
+        self.assertIn('Полных просмотров нет', out.getvalue())
+
+    def test_follow_is_unique(self):
+        """Повторная подписка на автора не создаёт дубликат."""
+        user = User.objects.create_user(username='user')
+        author = User.objects.create_user(username='author')
+        Follow.objects.create(user=user, author=author)
+        with self.assertRaises(IntegrityError):
+            Follow.objects.create(user=user, author=author)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class PregenerateThumbnailsTests(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def test_thumbnails_created_for_existing_images(self):
+        """Команда pregenerate_thumbnails кладёт в кэш resize копии для
+        srcset и заполняет размеры старых картинок."""
+        author = User.objects.create_user(username='author')
+        post = Post.objects.create(
+            author=author,
+            text='Пост с картинкой',
+            image=SimpleUploadedFile('small.gif', SMALL_GIF, 'image/gif'),
+        )
+        Post.objects.update(image_width=None, image_height=None)
+        out = StringIO()
+        call_command('pregenerate_thumbnails', processes=1, stdout=out)
+        self.assertIn('Обработано картинок: 1', out.getvalue())
+        width, height = resize.card_size(images.card_widths(2)[0])
+        self.assertTrue(os.path.exists(resize.cache_path(
+            resize.geometry(width, height, 'webp'), post.image.name
+        )))
+        post.refresh_from_db()
+        self.assertEqual((post.image_width, post.image_height), (2, 1))
+
+
+class ImportYatubeTests(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(username='author')
+        self.reader = User.objects.create_user(username='reader')
+        self.path = os.path.join(tempfile.mkdtemp(), 'dump.jsonl')
+        self.addCleanup(shutil.rmtree, os.path.dirname(self.path))
+
+    def write(self, records):
+        with open(self.path, 'w', encoding='utf-8') as stream:
+            for record in records:
+                stream.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+    def test_import_jsonl(self):
+        """import_yatube загружает записи пачками с их id и датами
+        и пересчитывает производные данные."""
+        self.write([
+            {'type': 'group', 'slug': 'cats', 'title': 'Коты'},
+            {'type': 'post', 'id': 501, 'author': 'author', 'group': 'cats',
+             'text': 'Пост про котов', 'pub_date': '2020-01-02T03:04:05'},
+            {'type': 'post', 'id': 502, 'author': 'author',
+             'text': 'Второй пост'},
+            {'type': 'comment', 'post': 501, 'author': 'reader',
+             'text': 'Мурлыканье'},
+            {'type': 'follow', 'user': 'reader', 'author': 'author'},
+            {'type': 'post', 'author': 'nobody', 'text': 'Пропуск'},
+        ])
+        out, err = StringIO(), StringIO()
+        call_command(
+            'import_yatube', self.path, batch_size=2, stdout=out, stderr=err
+        )
+        post = Post.objects.get(pk=501)
+        self.assertEqual(post.group.slug, 'cats')
+        self.assertEqual(post.pub_date.year, 2020)
+        self.assertEqual(Comment.objects.get().post_id, 501)
+        self.assertIn('пропущено: 1', out.getvalue())
+        self.assertIn('nobody', err.getvalue())
+        stats = AuthorStats.objects.get(author=self.author)
+        self.assertEqual(stats.posts_count, 2)
+        self.assertEqual(stats.followers_count, 1)
+        self.assertEqual(
+            FeedEntry.objects.filter(user=self.reader).count(), 2
+        )
+        if search.enabled():
+            self.assertEqual(search.search_post_ids('мурлыканье'), [501])
+
+    def test_create_users(self):
+        """С --create-users отсутствующие авторы создаются."""
+        self.write([{'type': 'post', 'author': 'newbie', 'text': 'Привет'}])
+        call_command(
+            'import_yatube', self.path, create_users=True, stdout=StringIO()
+        )
+        self.assertTrue(Post.objects.filter(author__username='newbie'))
+
+    def test_refresh_limited_to_imported_authors(self):
+        """После загрузки пересчитываются только затронутые авторы,
+        а --full-refresh пересчитывает весь сайт."""
+        other = User.objects.create_user(username='other')
+        Post.objects.create(author=other, text='Чужой пост')
+        AuthorStats.objects.filter(author=other).update(posts_count=7)
+        self.write([{'type': 'post', 'author': 'author', 'text': 'Новый'}])
+        call_command('import_yatube', self.path, stdout=StringIO())
+        self.assertEqual(
+            AuthorStats.objects.get(author=self.author).posts_count, 1
+        )
+        self.assertEqual(
+            AuthorStats.objects.get(author=other).posts_count, 7
+        )
+        call_command(
+            'import_yatube', self.path, full_refresh=True, stdout=StringIO()
+        )
+        self.assertEqual(
+            AuthorStats.objects.get(author=other).posts_count, 1
+        )
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ExportYatubeTests(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def test_export_can_be_imported(self):
+        """Выгрузка export_yatube загружается обратно import_yatube."""
+        author = User.objects.create_user(username='author')
+        post = Post.objects.create(
+            author=author,
+            text='Пост с картинкой',
+            image=SimpleUploadedFile('export.gif', SMALL_GIF, 'image/gif'),
+        )
+        Comment.objects.create(post=post, author=author, text='Комментарий')
+        path = os.path.join(tempfile.mkdtemp(), 'dump.jsonl')
+        self.addCleanup(shutil.rmtree, os.path.dirname(path))
+        out = StringIO()
+        call_command(
+            'export_yatube', output=path, images='inline', stdout=out
+        )
+        self.assertIn('Выгружено записей: 2', out.getvalue())
+        image = post.image.name
+        Post.objects.all().delete()
+        post.image.storage.delete(image)
+        call_command('import_yatube', path, stdout=StringIO())
+        post = Post.objects.get(pk=post.pk)
+        self.assertEqual(post.image.name, image)
+        self.assertEqual(post.image.read(), SMALL_GIF)
+        self.assertEqual(post.comments.get().text, 'Комментарий')
+
+
+class SeedYatubeTests(TestCase):
+    def test_seed_volumes(self):
+        """seed_yatube создаёт заданное число записей и пересчитывает
+        счётчики."""
+        call_command(
+            'seed_yatube', users=5, groups=2, posts=30, comments=10,
+            follows=4, batch_size=7, stdout=StringIO(),
+        )
+        self.assertEqual(User.objects.count(), 5)
+        self.assertEqual(Post.objects.count(), 30)
+        self.assertEqual(Comment.objects.count(), 10)
+        self.assertEqual(
+            sum(AuthorStats.objects.values_list('posts_count', flat=True)),
+            30,
+        )
+        self.assertEqual(FeedEntry.objects.count(), sum(
+            Post.objects.filter(author=follow.author).count()
+            for follow in Follow.objects.all()
+        ))
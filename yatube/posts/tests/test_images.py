@@ -0,0 +1,260 @@
+import os
+import shutil
+import tempfile
+import threading
+from io import BytesIO, StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+
+from .. import images, resize
+from ..models import Post, User
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+# Тег EXIF Orientation: 6 — повернуть на 90° по часовой стрелке.
+ORIENTATION = 0x0112
+
+
+MAKE = 0x010F
+
+
+def jpeg(size, orientation=None, image_format='JPEG'):
+    image = Image.new('RGB', size, 'red')
+    exif = Image.Exif()
+    exif[MAKE] = 'Camera'
+    if orientation:
+        exif[ORIENTATION] = orientation
+    options = {}
+    if image_format == 'MPO':
+        options = {'save_all': True, 'append_images': [image.copy()]}
+    buffer = BytesIO()
+    image.save(buffer, image_format, exif=exif.tobytes(), **options)
+    return buffer.getvalue()
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ImageProcessingTests(SimpleTestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    @override_settings(IMAGE_MAX_SIZE=40)
+    def test_normalize(self):
+        """Загрузка повёрнута по EXIF, без метаданных и не больше лимита."""
+        upload = SimpleUploadedFile(
+            'photo.jpg', jpeg((100, 50), orientation=6), 'image/jpeg'
+        )
+        normalized = images.normalize(upload)
+        self.assertEqual(normalized.name, 'photo.jpg')
+        with Image.open(normalized) as image:
+            self.assertEqual(image.size, (20, 40))
+            self.assertEqual(len(image.getexif()), 0)
+
+    def test_normalize_mpo(self):
+        """MPO с камеры сохраняется как JPEG первого кадра по тем же
+        правилам: поворот, без EXIF, не больше лимита."""
+        upload = SimpleUploadedFile(
+            'camera.jpg', jpeg((4000, 3000), 6, 'MPO'), 'image/jpeg'
+        )
+        with Image.open(upload) as image:
+            self.assertEqual(image.format, 'MPO')
+        normalized = images.normalize(upload)
+        with Image.open(normalized) as image:
+            self.assertEqual(image.format, 'JPEG')
+            self.assertEqual(
+                image.size, (settings.IMAGE_MAX_SIZE * 3 // 4,
+                             settings.IMAGE_MAX_SIZE)
+            )
+            self.assertEqual(len(image.getexif()), 0)
+
+    def test_background_queue_is_bounded(self):
+        """Копии режутся в фоне, картинки сверх очереди пропускаются."""
+        release, finished = threading.Event(), threading.Event()
+        done = []
+
+        def generate(name, image_width):
+            release.wait(5)
+            done.append(name)
+            finished.set()
+
+        slots = threading.Semaphore(1)
+        with mock.patch.object(images, '_slots', slots), \
+                mock.patch.object(images, 'generate', generate):
+            images.submit('posts/first.jpg')
+            with self.assertLogs('posts.images', 'WARNING'):
+                images.submit('posts/second.jpg')
+            self.assertEqual(done, [])
+            release.set()
+            self.assertTrue(finished.wait(5))
+            # Место в очереди освобождается после нарезки.
+            self.assertTrue(slots.acquire(timeout=5))
+        self.assertEqual(done, ['posts/first.jpg'])
+
+    def test_derivatives_and_srcset(self):
+        """Копии для srcset создаются заранее во всех ширинах."""
+        name = default_storage.save('posts/photo.jpg', ContentFile(
+            jpeg((1200, 800))
+        ))
+        paths = images.create_derivatives(name)
+        self.assertEqual(
+            len(paths), len(settings.IMAGE_WIDTHS) * len(resize.FORMATS)
+        )
+        with Image.open(resize.cache_path('320x113.webp', name)) as image:
+            self.assertEqual((image.format, image.size), ('WEBP', (320, 113)))
+        srcset = images.sources(name)['webp']
+        for width in settings.IMAGE_WIDTHS:
+            with self.subTest(width=width):
+                url = resize.url(
+                    resize.geometry(*resize.card_size(width), 'webp'), name
+                )
+                self.assertIn(f'{url} {width}w', srcset)
+
+    def test_no_upscaled_copies(self):
+        """Для узкой картинки srcset не содержит копий шире неё."""
+        widths = sorted(settings.IMAGE_WIDTHS)
+        self.assertEqual(images.card_widths(widths[1]), widths[:2])
+        self.assertEqual(images.card_widths(1), widths[:1])
+        sources = images.sources('posts/small.jpg', widths[0])
+        self.assertEqual(
+            (sources['width'], sources['height']),
+            resize.card_size(widths[0]),
+        )
+        self.assertEqual(sources['webp'].count('w,'), 0)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ImageDetailsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='author')
+
+    def test_details_filled_on_save(self):
+        """Размеры и заглушка картинки сохраняются вместе с постом."""
+        post = Post.objects.create(
+            author=self.user, text='Текст', image=SimpleUploadedFile(
+                'photo.jpg', jpeg((120, 90)), 'image/jpeg'
+            ),
+        )
+        post = Post.objects.get(pk=post.pk)
+        self.assertEqual((post.image_width, post.image_height), (120, 90))
+        self.assertTrue(
+            post.image_placeholder.startswith('data:image/webp;base64,')
+        )
+        post.image = ''
+        post.save()
+        self.assertEqual(
+            (post.image_width, post.image_height, post.image_placeholder),
+            (None, None, ''),
+        )
+
+    def test_card_uses_stored_size(self):
+        """Карточка берёт размеры из поста, не открывая файл."""
+        width = min(settings.IMAGE_WIDTHS)
+        with self.assertLogs('posts.images'):
+            post = Post.objects.create(
+                author=self.user, text='Текст', image='posts/missing.jpg'
+            )
+        Post.objects.filter(pk=post.pk).update(image_width=width + 1)
+        response = self.client.get(
+            reverse('posts:post_detail', args=[post.pk])
+        )
+        self.assertContains(
+            response, 'width="{}" height="{}"'.format(
+                *resize.card_size(width)
+            )
+        )
+
+    def test_missing_file(self):
+        """Пост с отсутствующим файлом сохраняется без размеров."""
+        with self.assertLogs('posts.images'):
+            post = Post.objects.create(
+                author=self.user, text='Текст', image='posts/missing.jpg'
+            )
+        self.assertIsNone(post.image_width)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ImageResizeTests(TestCase):
+    def setUp(self):
+        self.name = default_storage.save('posts/resize.jpg', ContentFile(
+            jpeg((800, 600))
+        ))
+        Post.objects.create(
+            author=User.objects.create_user(username='author'),
+            text='Текст', image=self.name,
+        )
+        self.addCleanup(
+            shutil.rmtree, resize.cache_root(), ignore_errors=True
+        )
+
+    def test_resize_on_first_request(self):
+        """Копия создаётся при первом запросе и кэшируется надолго."""
+        url = resize.url('640x226.webp', self.name)
+        self.assertFalse(
+            os.path.exists(resize.cache_path('640x226.webp', self.name))
+        )
+        for _ in range(2):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response['Content-Type'], 'image/webp')
+            self.assertIn('immutable', response['Cache-Control'])
+            content = b''.join(response.streaming_content)
+            with Image.open(BytesIO(content)) as image:
+                self.assertEqual(image.size, (640, 226))
+
+    def test_unknown_geometry_and_missing_image(self):
+        """Неизвестный размер и отсутствующая картинка дают 404."""
+        urls = (
+            resize.url('641x226.webp', self.name),
+            resize.url('640x226.png', self.name),
+            resize.url('640x226.webp', 'posts/missing.jpg'),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_only_post_images(self):
+        """Копии делаются только для картинок постов, а не для готовых
+        копий и других файлов."""
+        nested = resize.url('320x113.jpeg', self.name)
+        self.assertEqual(self.client.get(nested).status_code, 200)
+        orphan = default_storage.save('posts/orphan.jpg', ContentFile(
+            jpeg((800, 600))
+        ))
+        names = (
+            nested.split('/media/', 1)[1],
+            f'{resize.RESIZE_DIR}/320x113.jpeg/{self.name}',
+            orphan,
+            f'posts/../{self.name}',
+        )
+        for name in names:
+            with self.subTest(name=name):
+                response = self.client.get(resize.url('320x113.jpeg', name))
+                self.assertEqual(response.status_code, 404)
+
+    def test_cull_removes_least_recently_read(self):
+        """При переполнении удаляются копии, которые дольше не читали."""
+        paths = [
+            resize.ensure(resize.geometry(*resize.card_size(width), 'jpeg'),
+                          self.name)
+            for width in settings.IMAGE_WIDTHS
+        ]
+        for age, path in enumerate(reversed(paths)):
+            os.utime(path, (1000 + age, 1000 + age))
+        keep = os.path.getsize(paths[0])
+        self.assertEqual(resize.cull(keep)[0], len(paths) - 1)
+        self.assertEqual(
+            [os.path.exists(path) for path in paths],
+            [True] + [False] * (len(paths) - 1),
+        )
+        out = StringIO()
+        call_command('clean_resize_cache', clear=True, stdout=out)
+        self.assertIn('Удалено копий: 1', out.getvalue())
@@ -0,0 +1,119 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from .. import counts
+from ..models import Comment, Follow, Group, Post, User
+from .utils import QueryBudgetMixin
+
+POSTS_ON_PAGE = 10
+
+
+class FeedQueryBudgetTests(QueryBudgetMixin, TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Группа',
+            slug='test-slug',
+            description='Описание',
+        )
+        for i in range(POSTS_ON_PAGE):
+            author = User.objects.create_user(username=f'author_{i}')
+            Follow.objects.create(user=cls.reader, author=author)
+            cls.post = Post.objects.create(
+                author=author,
+                group=cls.group,
+                text=f'Пост {i}',
+            )
+            Comment.objects.create(post=cls.post, author=author, text='Ок')
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.reader)
+
+    def test_feeds_query_budget(self):
+        """Число запросов ленты не зависит от числа постов на странице."""
+        # Группе, профилю и посту нужен ещё один запрос для ETag.
+        budgets = {
+            reverse('posts:index'): 2,
+            reverse('posts:group_list', kwargs={'slug': 'test-slug'}): 4,
+            reverse(
+                'posts:profile', kwargs={'username': 'author_0'}
+            ): 5,
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk}): 4,
+        }
+        for url, budget in budgets.items():
+            with self.subTest(url=url):
+                self.assertQueryBudget(self.client, url, budget)
+
+    def test_follow_feed_query_budget(self):
+        """Лента подписок укладывается в бюджет запросов."""
+        self.assertQueryBudget(
+            self.authorized_client, reverse('posts:follow_index'), 5
+        )
+
+
+class FeedCountTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(
+            title='Группа', slug='counts', description='Описание'
+        )
+        Post.objects.bulk_create(
+            Post(author=cls.author, group=cls.group, text=f'Пост {i}')
+            for i in range(25)
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def count_queries(self, url, data=None):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url, data)
+        return response, [
+            query['sql'] for query in context.captured_queries
+            if 'COUNT(' in query['sql']
+        ]
+
+    def test_count_cached_and_maintained(self):
+        """COUNT(*) выполняется один раз, дальше число ведут сигналы."""
+        _, first = self.count_queries(reverse('posts:index'))
+        self.assertEqual(len(first), 1)
+        _, second = self.count_queries(reverse('posts:index'), {'page': 2})
+        self.assertEqual(second, [])
+        post = Post.objects.create(
+            author=self.author, group=self.group, text='Новый'
+        )
+        self.assertEqual(counts.index_count(), 26)
+        self.assertEqual(counts.group_count(self.group.pk), 26)
+        post.group = None
+        post.save()
+        self.assertEqual(counts.group_count(self.group.pk), 25)
+        post.delete()
+        self.assertEqual(counts.index_count(), 25)
+
+    def test_stale_count_corrected_by_page(self):
+        """Заниженное или завышенное число уточняется по странице."""
+        cache.set(counts.INDEX_KEY, 5)
+        response = self.client.get(reverse('posts:index'), {'page': 3})
+        page_obj = response.context['page_obj']
+        self.assertEqual(page_obj.number, 3)
+        self.assertEqual(len(page_obj), 5)
+        self.assertEqual(page_obj.paginator.count, 25)
+        cache.set(counts.INDEX_KEY, 1000)
+        response = self.client.get(reverse('posts:index'), {'page': 50})
+        page_obj = response.context['page_obj']
+        self.assertEqual(page_obj.number, 3)
+        self.assertEqual(page_obj.paginator.num_pages, 3)
+
+    def test_follow_count_from_stats(self):
+        """Число постов ленты подписок берётся из статистики авторов."""
+        reader = User.objects.create_user(username='reader')
+        Follow.objects.create(user=reader, author=self.author)
+        self.assertEqual(counts.follow_count(reader), 25)
@@ -0,0 +1,313 @@
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.db import connections
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from .. import sharding
+from ..bulk import refresh_denormalized
+from ..models import Comment, Follow, Group, Post, User
+
+SHARDS = ['shard0', 'shard1']
+
+
+class ShardDatabasesMixin:
+    databases = {'default', *SHARDS}
+
+    @classmethod
+    def setUpClass(cls):
+        for alias in SHARDS:
+            connections.databases[alias] = {
+                'ENGINE': 'django.db.backends.sqlite3',
+                'NAME': ':memory:',
+            }
+            call_command('migrate', database=alias, verbosity=0)
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        for alias in SHARDS:
+            connections[alias].close()
+            del connections.databases[alias]
+            delattr(connections._connections, alias)
+
+    def setUp(self):
+        cache.clear()
+        settings = override_settings(POST_SHARDS=SHARDS)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+
+class ShardingTests(ShardDatabasesMixin, TestCase):
+    def create_authors(self):
+        """По автору на каждый шард."""
+        authors = {}
+        for i in range(10):
+            user = User.objects.create_user(username=f'author_{i}')
+            authors.setdefault(sharding.shard_for(user.pk), user)
+            if len(authors) == len(SHARDS):
+                return authors
+        self.fail('Авторы попали на один шард')
+
+    def test_post_stored_on_author_shard(self):
+        """Пост и комментарий к нему лежат на шарде автора поста."""
+        group = Group.objects.create(title='Группа', slug='group')
+        for alias, author in self.create_authors().items():
+            with self.subTest(alias=alias):
+                post = Post.objects.create(
+                    author=author, group=group, text='Текст'
+                )
+                comment = Comment.objects.create(
+                    post=post, author=author, text='Ок'
+                )
+                self.assertEqual(post._state.db, alias)
+                self.assertEqual(comment._state.db, alias)
+                self.assertFalse(Post.objects.using('default').exists())
+                self.assertTrue(
+                    Group.objects.using(alias).filter(pk=group.pk).exists()
+                )
+
+    def test_ids_unique_across_shards(self):
+        ids = [
+            Post.objects.create(author=author, text='Текст').pk
+            for author in self.create_authors().values()
+            for _ in range(3)
+        ]
+        self.assertEqual(len(set(ids)), len(ids))
+
+    def test_index_merges_shards(self):
+        """Главная страница сливает посты шардов по дате."""
+        authors = list(self.create_authors().values())
+        posts = [
+            Post.objects.create(author=authors[i % 2], text=f'Пост {i}')
+            for i in range(12)
+        ]
+        expected = [post.pk for post in reversed(posts)]
+        response = self.client.get(reverse('posts:index'))
+        page_obj = response.context['page_obj']
+        self.assertEqual(page_obj.paginator.count, 12)
+        self.assertEqual([post.pk for post in page_obj], expected[:10])
+        response = self.client.get(reverse('posts:index') + '?page=2')
+        self.assertEqual(
+            [post.pk for post in response.context['page_obj']],
+            expected[10:],
+        )
+
+    def test_merge_keeps_ordering(self):
+        """Слияние идёт в порядке и направлении order_by выборки."""
+        authors = list(self.create_authors().values())
+        posts = [
+            Post.objects.create(author=authors[i % 2], text=f'Пост {i}')
+            for i in range(6)
+        ]
+        ids = [post.pk for post in posts]
+        merged = sharding.scatter(Post.objects.all())
+        self.assertEqual([post.pk for post in merged], ids[::-1])
+        self.assertEqual(
+            [post.pk for post in merged.order_by('pub_date', 'pk')[:4]],
+            ids[:4],
+        )
+
+    @override_settings(CURSOR_PAGINATION=True)
+    def test_cursor_pages_across_shards(self):
+        """Курсор «назад» возвращает ту же страницу со всех шардов."""
+        authors = list(self.create_authors().values())
+        for i in range(13):
+            Post.objects.create(author=authors[i % 2], text=f'Пост {i}')
+        url = reverse('posts:index')
+        first = self.client.get(url).context['page_obj']
+        second = self.client.get(
+            url, {'cursor': first.next_cursor}
+        ).context['page_obj']
+        back = self.client.get(
+            url, {'cursor': second.previous_cursor}
+        ).context['page_obj']
+        self.assertEqual(len(second), 3)
+        self.assertEqual(list(back), list(first))
+
+    def test_group_and_profile(self):
+        """Группа собирает посты со всех шардов, профиль — с одного."""
+        group = Group.objects.create(title='Группа', slug='group')
+        authors = list(self.create_authors().values())
+        for author in authors:
+            Post.objects.create(author=author, group=group, text='Текст')
+        response = self.client.get(
+            reverse('posts:group_list', args=[group.slug])
+        )
+        self.assertEqual(len(response.context['page_obj']), 2)
+        for author in authors:
+            with self.subTest(author=author.username):
+                response = self.client.get(
+                    reverse('posts:profile', args=[author.username])
+                )
+                self.assertEqual(
+                    [post.author for post in response.context['page_obj']],
+                    [author],
+                )
+
+    def test_follow_feed_and_detail(self):
+        """Лента подписок и страница поста читают нужный шард."""
+        authors = list(self.create_authors().values())
+        reader = User.objects.create_user(username='reader')
+        for author in authors:
+            Follow.objects.create(user=reader, author=author)
+        posts = [
+            Post.objects.create(author=author, text='Текст')
+            for author in authors
+        ]
+        self.client.force_login(reader)
+        response = self.client.get(reverse('posts:follow_index'))
+        self.assertEqual(
+            [post.pk for post in response.context['page_obj']],
+            [post.pk for post in reversed(posts)],
+        )
+        for post in posts:
+            with self.subTest(post=post.pk):
+                self.client.post(
+                    reverse('posts:add_comment', args=[post.pk]),
+                    {'text': 'Комментарий'},
+                )
+                response = self.client.get(
+                    reverse('posts:post_detail', args=[post.pk])
+                )
+                self.assertEqual(response.context['post'], post)
+                self.assertEqual(
+                    Comment.objects.using(post._state.db).filter(
+                        post=post
+                    ).count(),
+                    1,
+                )
+
+    def test_rebalance_moves_default_posts(self):
+        """rebalance_shards переносит посты из основной базы."""
+        authors = list(self.create_authors().values())
+        with override_settings(POST_SHARDS=[]):
+            posts = [
+                Post.objects.create(author=author, text='Текст')
+                for author in authors
+            ]
+            Comment.objects.create(post=posts[0], author=authors[1], text='Ок')
+        call_command(
+            'rebalance_shards', '--include-default', stdout=StringIO()
+        )
+        self.assertFalse(Post.objects.using('default').exists())
+        self.assertFalse(Comment.objects.using('default').exists())
+        for post in posts:
+            alias = sharding.shard_for(post.author_id)
+            self.assertTrue(
+                Post.objects.using(alias).filter(pk=post.pk).exists()
+            )
+        self.assertEqual(
+            Comment.objects.using(
+                sharding.shard_for(authors[0].pk)
+            ).get().post_id,
+            posts[0].pk,
+        )
+
+    def test_import_and_seed_write_to_shards(self):
+        """import_yatube и seed_yatube кладут посты и комментарии на
+        шарды, а не в основную базу."""
+        authors = list(self.create_authors().values())
+        path = os.path.join(tempfile.mkdtemp(), 'dump.jsonl')
+        self.addCleanup(shutil.rmtree, os.path.dirname(path))
+        records = [
+            {'type': 'group', 'slug': 'cats', 'title': 'Коты'},
+            {'type': 'post', 'id': 50, 'author': authors[0].username,
+             'group': 'cats', 'text': 'Загружен'},
+            {'type': 'post', 'author': authors[1].username, 'text': 'Без id'},
+            {'type': 'comment', 'post': 50, 'author': authors[1].username,
+             'text': 'Ок'},
+        ]
+        with open(path, 'w', encoding='utf-8') as stream:
+            for record in records:
+                stream.write(json.dumps(record, ensure_ascii=False) + '\n')
+        call_command('import_yatube', path, stdout=StringIO())
+        self.assertFalse(Post.objects.using('default').exists())
+        self.assertFalse(Comment.objects.using('default').exists())
+        shard = sharding.shard_for(authors[0].pk)
+        self.assertEqual(
+            Post.objects.using(shard).get(pk=50).group.slug, 'cats'
+        )
+        self.assertEqual(Comment.objects.using(shard).get().post_id, 50)
+        post = Post.objects.using(
+            sharding.shard_for(authors[1].pk)
+        ).get(author=authors[1])
+        self.assertGreater(post.pk, 50)
+        call_command(
+            'seed_yatube', users=3, groups=1, posts=12, comments=5,
+            follows=0, batch_size=4, stdout=StringIO(),
+        )
+        self.assertFalse(Post.objects.using('default').exists())
+        self.assertFalse(Comment.objects.using('default').exists())
+        self.assertEqual(
+            sum(Post.objects.using(alias).count() for alias in SHARDS), 14
+        )
+        self.assertEqual(
+            sum(Comment.objects.using(alias).count() for alias in SHARDS), 6
+        )
+        ids = [
+            pk for alias in SHARDS
+            for pk in Post.objects.using(alias).values_list('pk', flat=True)
+        ]
+        self.assertEqual(len(ids), len(set(ids)))
+
+    def test_sequence_advanced_after_bulk_load(self):
+        """После массовой вставки новые id не совпадают с загруженными."""
+        author = next(iter(self.create_authors().values()))
+        Post.objects.create(author=author, text='Текст')
+        Post.objects.using(sharding.shard_for(author.pk)).bulk_create([
+            Post(pk=100, author=author, text='Загружен')
+        ])
+        refresh_denormalized(stdout=StringIO())
+        self.assertEqual(
+            Post.objects.create(author=author, text='Текст').pk, 101
+        )
+
+    def test_api_and_export_read_shards(self):
+        """API и выгрузка читают посты и комментарии с шардов."""
+        authors = list(self.create_authors().values())
+        posts = [
+            Post.objects.create(author=author, text='Текст')
+            for author in authors
+        ]
+        Comment.objects.create(post=posts[0], author=authors[1], text='Ок')
+        response = self.client.get(reverse('api:post_list'))
+        self.assertEqual(
+            [post['id'] for post in response.json()['results']],
+            [post.pk for post in reversed(posts)],
+        )
+        response = self.client.get(
+            reverse('api:post_detail', args=[posts[1].pk])
+        )
+        self.assertEqual(response.json()['id'], posts[1].pk)
+        response = self.client.get(
+            reverse('api:comment_list', args=[posts[0].pk])
+        )
+        self.assertEqual(len(response.json()['results']), 1)
+        self.client.force_login(authors[1])
+        response = self.client.get(reverse('posts:export'))
+        records = [
+            json.loads(line) for line in b''.join(
+                response.streaming_content
+            ).decode().splitlines()
+        ]
+        self.assertEqual(
+            [record['type'] for record in records], ['post', 'comment']
+        )
+
+    def test_admin_refuses_sharded_models(self):
+        """Админка постов при шардах падает, а не показывает пустоту."""
+        admin = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='pass'
+        )
+        self.client.force_login(admin)
+        with self.assertRaises(ImproperlyConfigured):
+            self.client.get(reverse('admin:posts_post_changelist'))
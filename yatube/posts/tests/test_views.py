@@ -1,5 +1,7 @@
+import json
 import shutil
 import tempfile
+from http import HTTPStatus
 
 from django import forms
 from django.conf import settings
@@ -9,7 +11,9 @@ from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
 
-from ..models import Follow, Group, Post
+from ..cards import card_key
+from ..models import Comment, FeedEntry, Follow, Group, Post
+from ..utils import WindowedPaginator
 
 User = get_user_model()
 ten_posts = 10
@@ -243,16 +247,41 @@ class PostViewTest(TestCase):
     def test_cache_index(self):
         """Тест кеширования главной страницы."""
         first_object = self.authorized_client.get(reverse('posts:index'))
-        Post.objects.create(
-            text='Тест кэша',
-            author=PostViewTest.author
-        )
+        Post.objects.filter(pk=self.post.pk).update(text='Тест кэша')
         second_object = self.authorized_client.get(reverse('posts:index'))
         self.assertEqual(first_object.content, second_object.content)
         cache.clear()
         third_object = self.authorized_client.get(reverse('posts:index'))
         self.assertNotEqual(first_object.content, third_object.content)
 
+    def test_cache_invalidated_on_changes(self):
+        """Новый, изменённый и удалённый пост сразу видны на главной,
+        в группе и в профиле."""
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': 'test-slug'}),
+            reverse('posts:profile', kwargs={'username': 'test_user'}),
+        )
+        for url in urls:
+            self.client.get(url)
+        post = Post.objects.create(
+            text='Свежий пост',
+            author=PostViewTest.author,
+            group=PostViewTest.group,
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertContains(self.client.get(url), 'Свежий пост')
+        post.text = 'Исправленный пост'
+        post.save()
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertContains(self.client.get(url), 'Исправленный')
+        post.delete()
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertNotContains(self.client.get(url), 'Исправленный')
+
 
 class FollowingTests(TestCase):
     @classmethod
@@ -355,3 +384,347 @@ class FollowingTests(TestCase):
         )
         posts_after = len(response_1.context['page_obj'])
         self.assertEqual(posts_before, posts_after)
+
+    def test_follow_backfills_and_unfollow_prunes_feed(self):
+        """Подписка раскладывает старые посты автора в ленту,
+        отписка убирает их."""
+        self.authorized_client_follower.get(
+            reverse('posts:profile_follow',
+                    kwargs={'username': self.author})
+        )
+        self.assertTrue(FeedEntry.objects.filter(
+            user=self.follower, post=self.post
+        ).exists())
+        self.authorized_client_follower.get(
+            reverse('posts:profile_unfollow',
+                    kwargs={'username': self.author})
+        )
+        self.assertFalse(FeedEntry.objects.filter(
+            user=self.follower
+        ).exists())
+
+    @override_settings(FEED_FANOUT_LIMIT=0)
+    def test_popular_author_posts_pulled_on_read(self):
+        """Посты авторов с большим числом подписчиков не раскладываются
+        по лентам, но видны в ленте подписки."""
+        Follow.objects.create(user=self.follower, author=self.author)
+        post = Post.objects.create(
+            text='Новый текст',
+            author=FollowingTests.author,
+        )
+        self.assertFalse(FeedEntry.objects.filter(post=post).exists())
+        response = self.authorized_client_follower.get(
+            reverse('posts:follow_index')
+        )
+        self.assertIn(post, response.context['page_obj'])
+
+    @override_settings(FEED_FANOUT_LIMIT=1)
+    def test_author_back_under_fanout_limit(self):
+        """Когда подписчиков снова не больше лимита, посты, написанные
+        сверх лимита, раскладываются по лентам."""
+        Follow.objects.create(user=self.follower, author=self.author)
+        follow = Follow.objects.create(
+            user=self.user, author=self.author
+        )
+        post = Post.objects.create(
+            text='Новый текст',
+            author=FollowingTests.author,
+        )
+        self.assertFalse(FeedEntry.objects.filter(post=post).exists())
+        follow.delete()
+        self.assertTrue(FeedEntry.objects.filter(
+            user=self.follower, post=post
+        ).exists())
+        response = self.authorized_client_follower.get(
+            reverse('posts:follow_index')
+        )
+        self.assertIn(post, response.context['page_obj'])
+
+
+class WindowedPaginatorTests(TestCase):
+    def test_elided_page_range(self):
+        """Окно страниц содержит края, соседей текущей и многоточия."""
+        paginator = WindowedPaginator(range(1000), 10)
+        ellipsis = WindowedPaginator.ELLIPSIS
+        self.assertEqual(
+            list(paginator.get_elided_page_range(50)),
+            [1, 2, ellipsis, 47, 48, 49, 50, 51, 52, 53, ellipsis, 99, 100],
+        )
+        self.assertEqual(
+            list(paginator.get_elided_page_range(1)),
+            [1, 2, 3, 4, ellipsis, 99, 100],
+        )
+        small = WindowedPaginator(range(50), 10)
+        self.assertEqual(
+            list(small.get_elided_page_range(3)), [1, 2, 3, 4, 5]
+        )
+
+    def test_count_provider(self):
+        """Переданное число записей заменяет COUNT(*)."""
+        author = User.objects.create_user(username='author')
+        paginator = WindowedPaginator(
+            Post.objects.filter(author=author), 10, count=lambda: 95
+        )
+        with self.assertNumQueries(0):
+            self.assertEqual(paginator.num_pages, 10)
+
+    def test_paginator_links_are_bounded(self):
+        """Главная выводит окно ссылок, а не все страницы."""
+        author = User.objects.create_user(username='author')
+        Post.objects.bulk_create(
+            Post(author=author, text=f'Пост {i}') for i in range(300)
+        )
+        cache.clear()
+        response = self.client.get(reverse('posts:index'), {'page': 15})
+        self.assertContains(response, 'class="page-link"', count=17)
+        self.assertContains(response, WindowedPaginator.ELLIPSIS, count=2)
+
+
+@override_settings(CURSOR_PAGINATION=True)
+class CursorPaginatorTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='test_user')
+        Post.objects.bulk_create(
+            Post(author=cls.author, text=f'Пост {i}') for i in range(13)
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_cursor_pages(self):
+        """Курсоры ведут на следующую и предыдущую страницы
+        без пропусков и повторов."""
+        first = self.client.get(reverse('posts:index')).context['page_obj']
+        self.assertEqual(len(first), ten_posts)
+        self.assertFalse(first.has_previous())
+        second = self.client.get(
+            reverse('posts:index'), {'cursor': first.next_cursor}
+        ).context['page_obj']
+        self.assertEqual(len(second), three_posts)
+        self.assertFalse(second.has_next())
+        self.assertEqual(
+            {post.pk for post in first} | {post.pk for post in second},
+            set(Post.objects.values_list('pk', flat=True))
+        )
+        back = self.client.get(
+            reverse('posts:index'), {'cursor': second.previous_cursor}
+        ).context['page_obj']
+        self.assertEqual(list(back), list(first))
+
+    def test_broken_cursor_returns_first_page(self):
+        """Испорченный курсор открывает первую страницу."""
+        response = self.client.get(reverse('posts:index'), {'cursor': '%%'})
+        self.assertEqual(len(response.context['page_obj']), ten_posts)
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='test_user')
+        cls.post = Post.objects.create(
+            author=cls.author, text='Кот спит на диване, кот доволен'
+        )
+        cls.other_post = Post.objects.create(
+            author=cls.author, text='Собака гуляет'
+        )
+        cls.commented_post = Post.objects.create(
+            author=cls.author, text='Про погоду'
+        )
+        Comment.objects.create(
+            post=cls.commented_post, author=cls.author, text='А где кот?'
+        )
+
+    def search(self, query):
+        response = self.client.get(reverse('posts:search'), {'q': query})
+        return list(response.context['page_obj'])
+
+    def test_search_finds_posts_and_comments(self):
+        """Поиск находит посты по тексту и по комментариям,
+        совпадение в тексте поста выше."""
+        self.assertEqual(self.search('кот'), [self.post, self.commented_post])
+        self.assertEqual(self.search('собак'), [self.other_post])
+
+    def test_search_follows_edits_and_deletes(self):
+        """Индекс обновляется при изменении и удалении поста."""
+        self.other_post.text = 'Кошка гуляет'
+        self.other_post.save()
+        self.assertEqual(self.search('собака'), [])
+        self.assertEqual(self.search('кошка'), [self.other_post])
+        self.commented_post.delete()
+        self.assertEqual(self.search('кот'), [self.post])
+
+    def test_empty_query(self):
+        """Пустой запрос ничего не находит."""
+        self.assertEqual(self.search('!!!'), [])
+
+    def test_admin_search(self):
+        """Поиск в админке фильтрует посты подзапросом к индексу."""
+        admin = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='pass'
+        )
+        self.client.force_login(admin)
+        response = self.client.get(
+            reverse('admin:posts_post_changelist'), {'q': 'кот'}
+        )
+        self.assertEqual(list(response.context['cl'].result_list), [
+            self.post
+        ])
+
+
+class ConditionalGetTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='test_user')
+        cls.group = Group.objects.create(
+            title='Название',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        cls.post = Post.objects.create(
+            author=cls.author, group=cls.group, text='Тестовый текст'
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': 'test-slug'}),
+            reverse('posts:profile', kwargs={'username': 'test_user'}),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk}),
+        )
+
+    def test_not_modified_until_content_changes(self):
+        """Страница отвечает 304, пока её содержимое не изменилось."""
+        etags = {url: self.client.get(url)['ETag'] for url in self.urls}
+        for url, etag in etags.items():
+            with self.subTest(url=url):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(
+                    response.status_code, HTTPStatus.NOT_MODIFIED
+                )
+        self.post.text = 'Новый текст'
+        self.post.save()
+        for url, etag in etags.items():
+            with self.subTest(url=url):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, HTTPStatus.OK)
+
+    def test_follow_changes_profile(self):
+        """Подписка обновляет профили автора и подписчика."""
+        follower = User.objects.create_user(username='follower')
+        urls = (
+            reverse('posts:profile', kwargs={'username': 'test_user'}),
+            reverse('posts:profile', kwargs={'username': 'follower'}),
+        )
+        etags = {url: self.client.get(url)['ETag'] for url in urls}
+        Follow.objects.create(user=follower, author=self.author)
+        for url, etag in etags.items():
+            with self.subTest(url=url):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, HTTPStatus.OK)
+
+    def test_etag_depends_on_user(self):
+        """Гость и авторизованный пользователь получают разные ETag."""
+        client = Client()
+        client.force_login(self.author)
+        for url in self.urls:
+            with self.subTest(url=url):
+                self.assertNotEqual(
+                    self.client.get(url)['ETag'], client.get(url)['ETag']
+                )
+
+
+class ExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.other = User.objects.create_user(username='other')
+        cls.post = Post.objects.create(author=cls.author, text='Мой пост')
+        Post.objects.create(author=cls.other, text='Чужой пост')
+        Comment.objects.create(
+            post=cls.post, author=cls.author, text='Мой комментарий'
+        )
+        Follow.objects.create(user=cls.author, author=cls.other)
+
+    def test_export_streams_own_content(self):
+        """Выгрузка отдаёт потоком только записи пользователя."""
+        self.client.force_login(self.author)
+        response = self.client.get(reverse('posts:export'))
+        self.assertTrue(response.streaming)
+        self.assertIn('attachment', response['Content-Disposition'])
+        records = [
+            json.loads(line)
+            for line in b''.join(response.streaming_content).splitlines()
+        ]
+        self.assertEqual(
+            [record['type'] for record in records],
+            ['post', 'comment', 'follow'],
+        )
+        self.assertEqual(records[0]['text'], 'Мой пост')
+        self.assertEqual(records[2]['author'], 'other')
+
+    def test_export_requires_login(self):
+        """Гостя выгрузка отправляет на страницу входа."""
+        response = self.client.get(reverse('posts:export'))
+        self.assertEqual(response.status_code, HTTPStatus.FOUND)
+
+
+class PostCardCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(
+            title='Группа', slug='cards', description='Описание'
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.post = Post.objects.create(
+            author=self.author, group=self.group, text='Карточка'
+        )
+
+    def key(self, link=True):
+        return card_key(self.post.pk, self.post.updated_at, link)
+
+    def test_cards_rendered_from_cache(self):
+        """Ленты собирают карточки постов из кэша."""
+        self.client.get(reverse('posts:index'))
+        self.assertIn('Карточка', cache.get(self.key()))
+        cache.set(self.key(False), 'Из кэша')
+        response = self.client.get(
+            reverse('posts:group_list', kwargs={'slug': 'cards'})
+        )
+        self.assertContains(response, 'Из кэша')
+
+    def test_cards_evicted_on_edit_and_delete(self):
+        """Правка и удаление поста удаляют его карточки из кэша."""
+        self.client.get(reverse('posts:index'))
+        old_key = self.key()
+        self.post.text = 'Новый текст'
+        self.post.save()
+        self.assertIsNone(cache.get(old_key))
+        self.client.get(reverse('posts:index'))
+        self.assertIn('Новый текст', cache.get(self.key()))
+        self.post.delete()
+        self.assertIsNone(cache.get(self.key()))
+
+    def test_author_rename_refreshes_group_page(self):
+        """Новое имя автора сразу видно и на странице группы."""
+        url = reverse('posts:group_list', kwargs={'slug': 'cards'})
+        etag = self.client.get(url)['ETag']
+        self.author.first_name = 'Переименован'
+        self.author.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertContains(response, 'Переименован')
+
+    def test_group_rename_refreshes_cards(self):
+        """Смена адреса группы даёт постам новые ключи карточек."""
+        old_key = self.key()
+        self.group.slug = 'renamed'
+        self.group.save()
+        self.post.refresh_from_db()
+        self.assertNotEqual(self.key(), old_key)
@@ -1,11 +1,238 @@
-from django.core.paginator import Paginator
+import base64
+import binascii
+import hashlib
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.core.paginator import EmptyPage, PageNotAnInteger, Paginator
+from django.db.models import Q
+from django.utils.functional import cached_property
+from django.utils.dateparse import parse_datetime
+from django.views.decorators.http import condition
+
+from core.routers import require_fresh
+
+from .generations import generation, stamps
 
 POSTS_PER_PAGE = 10
 
 
-def paginator_func(post_list, request):
-    paginator = Paginator(post_list, POSTS_PER_PAGE)
+def paginator_func(post_list, request, count=None):
+    if settings.CURSOR_PAGINATION:
+        paginator = CursorPaginator(post_list, POSTS_PER_PAGE)
+        return paginator.get_page(request.GET.get('cursor'))
+    paginator = WindowedPaginator(post_list, POSTS_PER_PAGE, count=count)
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
 
     return page_obj
+
+
+class WindowedPaginator(Paginator):
+    """Paginator с окном номеров страниц вокруг текущей.
+
+    count можно передать числом или функцией без аргументов, например
+    приблизительное или закэшированное число записей: тогда COUNT(*)
+    по всей выборке не выполняется. Такое число уточняется по самой
+    странице: она читается с одной лишней записью, а за пределами
+    выборки считается точно.
+    """
+    ELLIPSIS = '…'
+
+    def __init__(self, object_list, per_page, count=None, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self._count = count
+
+    @cached_property
+    def count(self):
+        if self._count is None:
+            return super().count
+        if callable(self._count):
+            return self._count()
+        return self._count
+
+    def _set_count(self, count):
+        self.__dict__['count'] = count
+        self.__dict__.pop('num_pages', None)
+
+    def validate_number(self, number):
+        if self._count is None:
+            return super().validate_number(number)
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger('Номер страницы не число')
+        if number < 1:
+            raise EmptyPage('Номер страницы меньше 1')
+        return number
+
+    def page(self, number):
+        if self._count is None:
+            return super().page(number)
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        objects = list(self.object_list[bottom:bottom + self.per_page + 1])
+        if objects or number == 1:
+            seen = bottom + len(objects)
+            self._set_count(
+                seen if len(objects) <= self.per_page
+                else max(self.count, seen)
+            )
+            return self._get_page(objects[:self.per_page], number, self)
+        self._set_count(Paginator.count.func(self))
+        raise EmptyPage('На этой странице нет записей')
+
+    def get_page(self, number):
+        try:
+            return super().get_page(number)
+        except EmptyPage:
+            # Число записей оказалось завышенным и уже пересчитано.
+            return self.page(self.num_pages)
+
+    def get_elided_page_range(self, number=1, on_each_side=3, on_ends=2):
+        number = self.validate_number(number)
+        if self.num_pages <= (on_each_side + on_ends) * 2:
+            yield from self.page_range
+            return
+        if number > 1 + on_each_side + on_ends + 1:
+            yield from range(1, on_ends + 1)
+            yield self.ELLIPSIS
+            yield from range(number - on_each_side, number + 1)
+        else:
+            yield from range(1, number + 1)
+        if number < self.num_pages - on_each_side - on_ends - 1:
+            yield from range(number + 1, number + on_each_side + 1)
+            yield self.ELLIPSIS
+            yield from range(self.num_pages - on_ends + 1, self.num_pages + 1)
+        else:
+            yield from range(number + 1, self.num_pages + 1)
+
+
+class CursorPage:
+    is_cursor = True
+
+    def __init__(self, object_list, paginator, next_cursor=None,
+                 previous_cursor=None):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __repr__(self):
+        return '<CursorPage %s..%s>' % (
+            self.previous_cursor, self.next_cursor
+        )
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class CursorPaginator:
+    """Постраничный вывод по ключу (дата, id) без COUNT и OFFSET."""
+    NEXT = 'n'
+    PREVIOUS = 'p'
+
+    def __init__(self, object_list, per_page, field='pub_date'):
+        self.object_list = object_list
+        self.per_page = per_page
+        self.field = field
+
+    def encode(self, post, direction):
+        value = getattr(post, self.field).isoformat()
+        raw = f'{direction}|{value}|{post.pk}'
+        return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+    def decode(self, cursor):
+        try:
+            raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+            direction, value, pk = raw.decode().split('|')
+            value = parse_datetime(value)
+            pk = int(pk)
+        except (TypeError, ValueError, binascii.Error, UnicodeDecodeError):
+            return None
+        if direction not in (self.NEXT, self.PREVIOUS) or value is None:
+            return None
+        return direction, value, pk
+
+    def get_page(self, cursor):
+        position = self.decode(cursor) if cursor else None
+        field = self.field
+        queryset = self.object_list.order_by(f'-{field}', '-pk')
+        if position is None:
+            posts = list(queryset[:self.per_page + 1])
+            return self._page(posts, has_more=len(posts) > self.per_page)
+
+        direction, value, pk = position
+        if direction == self.NEXT:
+            posts = list(queryset.filter(
+                Q(**{f'{field}__lt': value})
+                | Q(**{field: value, 'pk__lt': pk})
+            )[:self.per_page + 1])
+            return self._page(
+                posts, has_more=len(posts) > self.per_page, has_before=True
+            )
+
+        posts = list(queryset.filter(
+            Q(**{f'{field}__gt': value}) | Q(**{field: value, 'pk__gt': pk})
+        ).order_by(field, 'pk')[:self.per_page + 1])
+        if not posts:
+            return self.get_page(None)
+        has_before = len(posts) > self.per_page
+        posts = posts[:self.per_page][::-1]
+        return self._page(posts, has_more=True, has_before=has_before)
+
+    def _page(self, posts, has_more, has_before=False):
+        posts = posts[:self.per_page]
+        next_cursor = previous_cursor = None
+        if posts and has_more:
+            next_cursor = self.encode(posts[-1], self.NEXT)
+        if posts and has_before:
+            previous_cursor = self.encode(posts[0], self.PREVIOUS)
+        return CursorPage(posts, self, next_cursor, previous_cursor)
+
+
+def conditional_page(scopes_func):
+    """ETag и Last-Modified страницы по поколениям её содержимого.
+
+    scopes_func(request, *args, **kwargs) возвращает области страницы
+    или None, если объекта нет (тогда ответит сама вьюха). Недавно
+    изменённая страница читается из основной базы, а не с реплики.
+    """
+    def page_scopes(request, *args, **kwargs):
+        if not hasattr(request, '_page_scopes'):
+            scopes = scopes_func(request, *args, **kwargs)
+            if scopes:
+                require_fresh(max(stamps(*scopes)))
+            request._page_scopes = scopes
+        return request._page_scopes
+
+    def etag(request, *args, **kwargs):
+        scopes = page_scopes(request, *args, **kwargs)
+        if scopes is None:
+            return None
+        key = (f'{generation(*scopes)}:{request.user.pk}:'
+               f'{request.get_full_path()}')
+        return hashlib.md5(key.encode()).hexdigest()
+
+    def last_modified(request, *args, **kwargs):
+        scopes = page_scopes(request, *args, **kwargs)
+        if scopes is None:
+            return None
+        return datetime.fromtimestamp(max(stamps(*scopes)), tz=timezone.utc)
+
+    return condition(etag_func=etag, last_modified_func=last_modified)
@@ -1,55 +1,120 @@
+from functools import partial
+
+from django.conf import settings
 from django.contrib.auth.decorators import login_required
+from django.http import FileResponse, Http404, StreamingHttpResponse
 from django.shortcuts import get_object_or_404, redirect, render
 
+from . import counts, resize, sharding
+from .export import IMAGE_MODES, jsonl, user_records
+from .feed import follow_feed
 from .forms import CommentForm, PostForm
+from .generations import (INDEX, follow_scope, generation, group_scope,
+                          post_scope, profile_scope)
 from .models import Follow, Group, Post, User
-from .utils import paginator_func
+from .search import search_post_ids
+from .stats import author_stats
+from .utils import (POSTS_PER_PAGE, WindowedPaginator, conditional_page,
+                    paginator_func)
+
+SEARCH_RESULTS_LIMIT = 1000
+
+
+def user_scopes(request):
+    if request.user.is_authenticated:
+        return [follow_scope(request.user.pk)]
+    return []
+
+
+def index_scopes(request):
+    return [INDEX]
+
+
+def group_scopes(request, slug):
+    group_id = Group.objects.filter(
+        slug=slug
+    ).values_list('pk', flat=True).first()
+    if group_id is None:
+        return None
+    return [group_scope(group_id)]
+
 
-POSTS_PER_PAGE = 10
+def profile_scopes(request, username):
+    author_id = User.objects.filter(
+        username=username
+    ).values_list('pk', flat=True).first()
+    if author_id is None:
+        return None
+    return [profile_scope(author_id), *user_scopes(request)]
 
 
+def post_scopes(request, post_id):
+    post = sharding.first(
+        Post.objects.filter(pk=post_id).values('author', 'group')
+    )
+    if post is None:
+        return None
+    scopes = [post_scope(post_id), profile_scope(post['author'])]
+    if post['group'] is not None:
+        scopes.append(group_scope(post['group']))
+    return scopes
+
+
+def follow_scopes(request):
+    return [INDEX, *user_scopes(request)]
+
+
+@conditional_page(index_scopes)
 def index(request):
-    post_list = Post.objects.all()
-    page_obj = paginator_func(post_list, request)
+    post_list = sharding.scatter(Post.objects.for_feed())
+    page_obj = paginator_func(post_list, request, count=counts.index_count)
     context = {
         'page_obj': page_obj,
+        'generation': generation(INDEX),
     }
     return render(request, 'posts/index.html', context)
 
 
+@conditional_page(group_scopes)
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
-    post_list = group.posts.all()[:POSTS_PER_PAGE]
-    page_obj = paginator_func(post_list, request)
+    post_list = sharding.scatter(group.posts.for_feed())
+    page_obj = paginator_func(
+        post_list, request, count=partial(counts.group_count, group.pk)
+    )
     context = {
         'group': group,
         'page_obj': page_obj,
+        'generation': generation(group_scope(group.pk)),
     }
     return render(request, 'posts/group_list.html', context)
 
 
+@conditional_page(profile_scopes)
 def profile(request, username):
     author = User.objects.get(username=username)
-    posts = Post.objects.filter(author=author)
-    page_obj = paginator_func(posts, request)
-    post_count = posts.count
+    posts = Post.objects.for_feed().for_author(author.pk)
+    stats = author_stats(author)
+    page_obj = paginator_func(posts, request, count=stats.posts_count)
     following = (request.user.is_authenticated and Follow.objects.filter(
                  user=request.user, author=author
                  ).exists())
     context = {
         'author': author,
         'page_obj': page_obj,
-        'post_count': post_count,
+        'post_count': stats.posts_count,
+        'stats': stats,
         'following': following,
-
+        'generation': generation(profile_scope(author.pk)),
     }
     return render(request, "posts/profile.html", context)
 
 
+@conditional_page(post_scopes)
 def post_detail(request, post_id):
-    post = get_object_or_404(Post, pk=post_id)
-    comments = post.comments.all()
-    post_count = Post.objects.filter(author=post.author).count()
+    post = sharding.get_post_or_404(Post.objects.for_feed(), post_id)
+    comments = post.comments.select_related('author')
+    post_count = author_stats(post.author).posts_count
     form = CommentForm(request.POST)
     context = {
         'post': post,
@@ -60,6 +125,24 @@ def post_detail(request, post_id):
     return render(request, 'posts/post_detail.html', context)
 
 
+def search(request):
+    query = request.GET.get('q', '').strip()
+    post_ids = search_post_ids(query, limit=SEARCH_RESULTS_LIMIT)
+    page_obj = WindowedPaginator(post_ids, POSTS_PER_PAGE).get_page(
+        request.GET.get('page')
+    )
+    posts = Post.objects.for_feed().in_bulk(page_obj.object_list)
+    page_obj.object_list = [
+        posts[post_id] for post_id in page_obj.object_list
+        if post_id in posts
+    ]
+    context = {
+        'query': query,
+        'page_obj': page_obj,
+    }
+    return render(request, 'posts/search.html', context)
+
+
 @login_required
 def post_create(request):
     form = PostForm(request.POST)
@@ -97,7 +180,7 @@ def post_create(request):
 
 
 def post_edit(request, post_id):
-    post = get_object_or_404(Post, pk=post_id)
+    post = sharding.get_post_or_404(Post.objects.all(), post_id)
     if post.author != request.user:
         return redirect('posts:post_detail', post_id=post_id)
 
@@ -119,7 +202,7 @@ def post_edit(request, post_id):
 
 @login_required
 def add_comment(request, post_id):
-    post = get_object_or_404(Post, pk=post_id)
+    post = sharding.get_post_or_404(Post.objects.all(), post_id)
     form = CommentForm(request.POST or None)
     if form.is_valid():
         comment = form.save(commit=False)
@@ -130,21 +213,58 @@ def add_comment(request, post_id):
 
 
 @login_required
+@conditional_page(follow_scopes)
 def follow_index(request):
-    post_list = Post.objects.filter(author__following__user=request.user)
-    page_obj = paginator_func(post_list, request)
+    post_list = follow_feed(request.user).for_feed()
+    page_obj = paginator_func(
+        post_list, request,
+        count=partial(counts.follow_count, request.user),
+    )
     context = {
         'page_obj': page_obj,
+        'generation': generation(INDEX, follow_scope(request.user.pk)),
     }
     return render(request, 'posts/follow.html', context)
 
 
+@login_required
+def export(request):
+    images = request.GET.get('images')
+    if images not in IMAGE_MODES:
+        images = 'path'
+    response = StreamingHttpResponse(
+        jsonl(user_records(request.user, images)),
+        content_type='application/x-ndjson; charset=utf-8',
+    )
+    response['Content-Disposition'] = (
+        f'attachment; filename="yatube-{request.user.username}.jsonl"'
+    )
+    return response
+
+
+def image_resize(request, geometry, name):
+    parsed = resize.parse_geometry(geometry)
+    if parsed is None:
+        raise Http404('Неизвестный размер картинки')
+    try:
+        stream = resize.open_resized(geometry, name)
+    except OSError:
+        raise Http404('Картинка не найдена')
+    response = FileResponse(
+        stream, content_type=resize.CONTENT_TYPES[parsed[2]]
+    )
+    # Адрес копии меняется вместе с картинкой: кэшировать можно навсегда.
+    response['Cache-Control'] = (
+        f'public, max-age={settings.IMAGE_RESIZE_MAX_AGE}, immutable'
+    )
+    return response
+
+
 @login_required
 def profile_follow(request, username):
     author = get_object_or_404(User, username=username)
-    following = Follow.objects.filter(user=request.user, author=author)
-    if request.user != author and not following:
-        Follow.objects.create(user=request.user, author=author)
+    if request.user != author:
+        Follow.objects.get_or_create(user=request.user, author=author)
     return redirect('posts:profile', username=username)
 
 
@@ -28,10 +28,13 @@ INSTALLED_APPS = [
     'users.apps.UsersConfig',
     'core.apps.CoreConfig',
     'about.apps.AboutConfig',
-    'sorl.thumbnail',
+    'api.apps.ApiConfig',
 ]
 
 MIDDLEWARE = [
+    'core.middleware.MetricsMiddleware',
+    'core.middleware.QueryInstrumentationMiddleware',
+    'core.routers.ReplicaPinMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -67,6 +70,7 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        'CONN_MAX_AGE': 60,
     }
 }
 
@@ -118,8 +122,152 @@ CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Общий для всех процессов кэш.
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': 'core.cache.SQLiteCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache.sqlite3'),
+        'OPTIONS': {
+            'MAX_ENTRIES': 100000,
+            'MAX_SIZE': 256 * 1024 * 1024,
+            'LOCK_TIMEOUT': 5,
+        },
     }
 }
+
+# Тесты держат кэш и метрики во временном каталоге.
+TEST_RUNNER = 'core.runner.IsolatedStoresRunner'
+
+# Постраничный вывод лент по курсору (pub_date, id) вместо номеров страниц.
+CURSOR_PAGINATION = False
+
+# Лента подписок: посты раскладываются по лентам подписчиков при записи,
+# кроме авторов, у которых подписчиков больше FEED_FANOUT_LIMIT.
+FEED_FANOUT_LIMIT = 10000
+
+FEED_BATCH_SIZE = 1000
+
+# Загруженные картинки (posts.images): длинная сторона оригинала,
+# ширины копий для srcset и качество сжатия JPEG и WebP.
+IMAGE_MAX_SIZE = 2048
+
+IMAGE_WIDTHS = (320, 640, 960)
+
+IMAGE_QUALITY = 80
+
+# Копии для srcset нарезаются в фоне после сохранения поста: потоков
+# в пуле и сколько картинок может ждать очереди. Без IMAGE_PREGENERATE
+# копии создаются только при первом запросе.
+IMAGE_PREGENERATE = True
+
+IMAGE_WORKERS = 2
+
+IMAGE_QUEUE_SIZE = 100
+
+# Кэш копий картинок на диске (posts.resize): предельный размер в байтах,
+# как часто проверять предел (раз в столько созданных копий) и сколько
+# секунд браузерам и прокси хранить копию.
+IMAGE_RESIZE_MAX_SIZE = 512 * 1024 * 1024
+
+IMAGE_RESIZE_CULL_EVERY = 100
+
+IMAGE_RESIZE_MAX_AGE = 60 * 60 * 24 * 365
+
+# Сколько хранится число постов общей ленты и лент групп (posts.counts).
+FEED_COUNT_TIMEOUT = 60 * 60
+
+# Готовый HTML карточек постов (posts.cards).
+POST_CARD_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Реплики для чтения — псевдонимы из DATABASES. Для SQLite это копии
+# db.sqlite3, которые обновляет manage.py sync_replicas, например:
+# DATABASES['replica'] = {
+#     'ENGINE': 'django.db.backends.sqlite3',
+#     'NAME': os.path.join(BASE_DIR, 'replica.sqlite3'),
+#     'TEST': {'MIRROR': 'default'},
+# }
+DATABASE_REPLICAS = []
+
+# Шарды постов и комментариев — псевдонимы из DATABASES (posts.sharding).
+# Пост попадает на шард по автору; после изменения списка посты
+# переносит manage.py rebalance_shards. Пустой список — всё в default.
+POST_SHARDS = []
+
+DATABASE_ROUTERS = [
+    'posts.sharding.ShardRouter',
+    'core.routers.ReplicaRouter',
+]
+
+# После записи пользователь читает из основной базы столько секунд.
+REPLICA_PIN_SECONDS = 5
+
+REPLICA_PIN_COOKIE = 'pin_primary'
+
+# Страницы только для чтения, которым можно читать с реплик.
+REPLICA_VIEWS = [
+    'posts:index',
+    'posts:group_list',
+    'posts:profile',
+    'posts:post_detail',
+    'posts:follow_index',
+]
+
+# PRAGMA для каждого нового соединения с SQLite (core.db): WAL позволяет
+# читать во время записи, остальное уменьшает число обращений к диску.
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -64 * 1024,
+    'temp_store': 'MEMORY',
+}
+
+# Учёт SQL-запросов каждого запроса (core.middleware); None — как DEBUG.
+SQL_INSTRUMENTATION = None
+
+SQL_SLOWEST_QUERIES = 3
+
+# Бюджеты по имени представления: число запросов или
+# {'queries': ..., 'db_ms': ...}. Превышение пишется в журнал core.sql.
+SQL_QUERY_BUDGETS = {
+    'posts:index': 5,
+    'posts:group_list': 7,
+    'posts:profile': 8,
+    'posts:post_detail': 7,
+    'posts:follow_index': 8,
+    'posts:search': 5,
+}
+
+# Метрики для /metrics: общий для процессов файл и интервал записи в него.
+METRICS_STORE = os.path.join(BASE_DIR, 'metrics.sqlite3')
+
+METRICS_FLUSH_INTERVAL = 5
+
+# Кроме персонала, /metrics открыт адресам из METRICS_ALLOWED_IPS и
+# запросам с заголовком «Authorization: Bearer <METRICS_TOKEN>».
+METRICS_ALLOWED_IPS = []
+
+METRICS_TOKEN = ''
+
+# Кэши, для которых считаются попадания: имя -> префикс ключа.
+METRICS_CACHE_PREFIXES = {
+    'index_page': 'template.cache.index_page.',
+}
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'core.sql': {
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
+}
@@ -3,6 +3,9 @@ from django.urls import include, path
 from django.conf import settings
 from django.conf.urls.static import static
 
+from core.views import metrics
+from posts.views import image_resize
+
 handler404 = 'core.views.page_not_found'
 handler403 = 'core.views.csrf_failure'
 handler500 = 'core.views.server_error'
@@ -13,6 +16,13 @@ urlpatterns = [
     path('auth/', include('users.urls', namespace='users')),
     path('auth/', include('django.contrib.auth.urls')),
     path('about/', include('about.urls', namespace='about')),
+    path('api/v1/', include('api.urls', namespace='api')),
+    path('metrics', metrics, name='metrics'),
+    path(
+        settings.MEDIA_URL.lstrip('/') + 'resize/<str:geometry>/<path:name>',
+        image_resize,
+        name='image_resize',
+    ),
 ]
 
 if settings.DEBUG: